@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from models.measurement_table import NUMERIC_COLUMNS
+
+from app.functions import cache_dir, iso_date, sha256_file
+from app.parser import parse_and_detect
+from app.systemConfig import BEST_MODE_FILE, SYSTEM_AUTO, SYSTEM_CHOICES
+from app.validation_engine import compile_rules
+
+ARCHIVE_FILE = "archive.sqlite3"
+SCHEMA_VERSION = 2
+BATCH_RUNS = 50
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    instrument TEXT NOT NULL,
+    system_type TEXT,
+    run_date TEXT,
+    header TEXT,
+    oe INTEGER NOT NULL DEFAULT 0,
+    source_path TEXT NOT NULL UNIQUE,
+    source_sha256 TEXT NOT NULL,
+    ingested_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    mode_index INTEGER NOT NULL,
+    measured_at TEXT,
+    setup TEXT,
+    mode TEXT,
+    specification TEXT,
+    {", ".join(f"{name} REAL" for name in NUMERIC_COLUMNS)}
+);
+CREATE TABLE IF NOT EXISTS violations (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    mode_index INTEGER NOT NULL,
+    param TEXT NOT NULL,
+    min REAL,
+    max REAL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_system_date ON runs(system_type, run_date);
+CREATE INDEX IF NOT EXISTS idx_runs_instrument ON runs(instrument, run_date);
+CREATE INDEX IF NOT EXISTS idx_measurements_mode_date ON measurements(mode_index, measured_at);
+CREATE INDEX IF NOT EXISTS idx_measurements_date ON measurements(measured_at);
+CREATE INDEX IF NOT EXISTS idx_measurements_run ON measurements(run_id);
+CREATE INDEX IF NOT EXISTS idx_violations_run ON violations(run_id, mode_index);
+"""
+
+MEASUREMENT_COLUMNS = ("run_id", "mode_index", "measured_at", "setup", "mode", "specification") + NUMERIC_COLUMNS
+INSERT_MEASUREMENT = (
+    f"INSERT INTO measurements ({', '.join(MEASUREMENT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in MEASUREMENT_COLUMNS)})"
+)
+INSERT_VIOLATION = "INSERT INTO violations (run_id, mode_index, param, min, max) VALUES (?, ?, ?, ?, ?)"
+
+def default_archive_path():
+    return os.path.join(cache_dir(), ARCHIVE_FILE)
+
+def find_logs(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if BEST_MODE_FILE in filenames:
+            yield os.path.join(dirpath, BEST_MODE_FILE)
+
+def instrument_of(path):
+    # Logs are stored as <instrument>/<run>/BestModeData_V3.txt. A log whose run folder
+    # sits at the filesystem root is filed under the run folder itself.
+    run_dir = os.path.dirname(os.path.abspath(path))
+    return os.path.basename(os.path.dirname(run_dir)) or os.path.basename(run_dir)
+
+def parse_run(path, system_hint=SYSTEM_AUTO, sha256=None):
+    system, flags, detection = parse_and_detect(path, system_hint=system_hint)
+    run = {
+        "path": os.path.abspath(path),
+        "sha256": sha256 or sha256_file(path),
+        "system_type": detection.system,
+        "header": system.name if system else None,
+        "run_date": iso_date(system.name) if system else None,
+        # OE runs keep their violations; the report only stops highlighting them.
+        "oe": bool(flags["oe"]),
+        "rows": [],
+        "violations": [],
+    }
+    if system is None:
+        return run
+
+    table = system.results
+    columns = [table.column(name) for name in NUMERIC_COLUMNS]
+    for i, m in enumerate(table):
+        run["rows"].append(
+            (m.mode_index, iso_date(m.date), m.setup, m.mode, m.specification) + tuple(c[i] for c in columns)
+        )
+
+    if detection.system:
+        for v in compile_rules(detection.system).evaluate(table).violations:
+            lo, hi = v.range if v.range else (None, None)
+            run["violations"].append((v.mode_index, v.param, lo, hi))
+    if run["run_date"] is None and run["rows"]:
+        run["run_date"] = run["rows"][0][1]
+    return run
+
+class Archive():
+    def __init__(self, path=None):
+        self.path = path or default_archive_path()
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(runs)")}
+        if "oe" not in columns:
+            self.conn.execute("ALTER TABLE runs ADD COLUMN oe INTEGER NOT NULL DEFAULT 0")
+        if 0 < version < 2:
+            # Version 1 dropped the violations of OE runs and did not record the flag:
+            # forget the hashes so the next ingest parses every run again.
+            self.conn.execute("UPDATE runs SET source_sha256 = ''")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def known_sources(self):
+        return dict(self.conn.execute("SELECT source_path, source_sha256 FROM runs"))
+
+    def _insert_run(self, run, instrument):
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM runs WHERE source_path = ?", (run["path"],))
+        cur.execute(
+            "INSERT INTO runs (instrument, system_type, run_date, header, oe, source_path, source_sha256, ingested_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (instrument, run["system_type"], run["run_date"], run["header"], int(run["oe"]), run["path"], run["sha256"],
+             datetime.now().isoformat(sep=" ", timespec="seconds")),
+        )
+        run_id = cur.lastrowid
+        cur.executemany(INSERT_MEASUREMENT, ((run_id,) + row for row in run["rows"]))
+        cur.executemany(INSERT_VIOLATION, ((run_id,) + v for v in run["violations"]))
+        return run_id
+
+    def ingest_runs(self, runs, instrument=None, batch_size=BATCH_RUNS):
+        count = 0
+        for run in runs:
+            self._insert_run(run, instrument or instrument_of(run["path"]))
+            count += 1
+            if count % batch_size == 0:
+                self.conn.commit()
+        self.conn.commit()
+        return count
+
+    def ingest(self, paths, system_hint=SYSTEM_AUTO, instrument=None, workers=None, force=False, errors=None):
+        known = {} if force else self.known_sources()
+        # Each file is hashed once here; the digest travels with it to parse_run.
+        pending, digests = [], []
+        for path in (os.path.abspath(p) for p in paths):
+            try:
+                digest = sha256_file(path)
+            except OSError as e:
+                if errors is not None:
+                    errors.append((path, str(e)))
+                continue
+            if known.get(path) != digest:
+                pending.append(path)
+                digests.append(digest)
+
+        def parsed():
+            if workers == 1 or len(pending) <= 1:
+                yield from (_safe_parse(p, system_hint, d) for p, d in zip(pending, digests))
+                return
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                yield from pool.map(_safe_parse, pending, [system_hint] * len(pending), digests, chunksize=8)
+
+        def ok_runs():
+            for path, run, error in parsed():
+                if error is not None:
+                    if errors is not None:
+                        errors.append((path, error))
+                    continue
+                yield run
+
+        return self.ingest_runs(ok_runs(), instrument)
+
+    def ingest_tree(self, root, **kwargs):
+        return self.ingest(list(find_logs(root)), **kwargs)
+
+    def values(self, param, mode_index, system_type=None, instrument=None, since=None, until=None):
+        if param not in NUMERIC_COLUMNS:
+            raise ValueError(f"Unknown parameter: {param}")
+        sql = [
+            f"SELECT m.measured_at, m.{param}, r.instrument, r.system_type FROM measurements m",
+            "JOIN runs r ON r.id = m.run_id",
+            "WHERE m.mode_index = ?",
+        ]
+        args = [mode_index]
+        if since:
+            sql.append("AND m.measured_at >= ?")
+            args.append(since)
+        if until:
+            sql.append("AND m.measured_at < ?")
+            args.append(until)
+        if system_type:
+            sql.append("AND r.system_type = ?")
+            args.append(system_type)
+        if instrument:
+            sql.append("AND r.instrument = ?")
+            args.append(instrument)
+        sql.append("ORDER BY m.measured_at")
+        return self.conn.execute(" ".join(sql), args).fetchall()
+
+    def violations(self, system_type=None, since=None, param=None, oe=None):
+        sql = [
+            "SELECT r.run_date, r.instrument, r.system_type, v.mode_index, v.param, v.min, v.max FROM violations v",
+            "JOIN runs r ON r.id = v.run_id WHERE 1 = 1",
+        ]
+        args = []
+        if system_type:
+            sql.append("AND r.system_type = ?")
+            args.append(system_type)
+        if since:
+            sql.append("AND r.run_date >= ?")
+            args.append(since)
+        if param:
+            sql.append("AND v.param = ?")
+            args.append(param)
+        if oe is not None:
+            sql.append("AND r.oe = ?")
+            args.append(int(oe))
+        sql.append("ORDER BY r.run_date, v.mode_index")
+        return self.conn.execute(" ".join(sql), args).fetchall()
+
+def _safe_parse(path, system_hint, sha256=None):
+    try:
+        return path, parse_run(path, system_hint, sha256), None
+    except Exception as e:
+        return path, None, str(e)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Archive parsed BestModeData runs in SQLite.")
+    parser.add_argument("--db", default=None, help="Archive file (default: IONify cache folder)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="Ingest every BestModeData_V3.txt below the given folders")
+    ingest.add_argument("roots", nargs="+")
+    ingest.add_argument("--system", choices=tuple(SYSTEM_CHOICES), default="auto")
+    ingest.add_argument("--instrument", default=None, help="Instrument name (default: parent of each run folder)")
+    ingest.add_argument("--workers", type=int, default=None)
+    ingest.add_argument("--force", action="store_true", help="Re-ingest files that have not changed")
+
+    query = sub.add_parser("query", help="Print one parameter for one mode over time")
+    query.add_argument("param", choices=NUMERIC_COLUMNS)
+    query.add_argument("mode_index", type=int)
+    query.add_argument("--system-type", default=None)
+    query.add_argument("--instrument", default=None)
+    query.add_argument("--since", default=None, help="ISO date, e.g. 2025-01-01")
+    query.add_argument("--until", default=None)
+    query.add_argument("--json", action="store_true")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    with Archive(args.db) as archive:
+        if args.command == "ingest":
+            hint = SYSTEM_CHOICES[args.system]
+            errors = []
+            count = 0
+            for root in args.roots:
+                count += archive.ingest_tree(root, system_hint=hint, instrument=args.instrument,
+                                             workers=args.workers, force=args.force, errors=errors)
+            print(f"Ingested {count} run(s) into {archive.path}")
+            for path, error in errors:
+                print(f"    {path}: {error}", file=sys.stderr)
+            return 3 if errors else 0
+
+        rows = archive.values(args.param, args.mode_index, args.system_type, args.instrument, args.since, args.until)
+        if args.json:
+            print(json.dumps([dict(zip(("measured_at", args.param, "instrument", "system_type"), r)) for r in rows], indent=2))
+        else:
+            for measured_at, value, instrument, system_type in rows:
+                print(f"{measured_at}  {value:>10}  {instrument}  {system_type}")
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
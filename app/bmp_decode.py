@@ -0,0 +1,93 @@
+import mmap
+import struct
+
+# BITMAPFILEHEADER followed by the fields of BITMAPINFOHEADER that decide the pixel layout.
+FILE_HEADER = struct.Struct("<2sIHHI")
+INFO_HEADER = struct.Struct("<IiiHHI")
+BI_RGB = 0
+
+def read_header(f):
+    head = f.read(FILE_HEADER.size + INFO_HEADER.size)
+    if len(head) < FILE_HEADER.size + INFO_HEADER.size:
+        return None
+    magic, _, _, _, offset = FILE_HEADER.unpack_from(head)
+    header_size, width, height, planes, bpp, compression = INFO_HEADER.unpack_from(head, FILE_HEADER.size)
+    # Only plain BGR/BGRX rasters; palettes, bitfields and RLE go through PIL.
+    if magic != b"BM" or header_size < 40 or planes != 1 or bpp not in (24, 32) or compression != BI_RGB:
+        return None
+    if width <= 0 or height == 0:
+        return None
+    return offset, width, height, bpp
+
+# How much larger than the target a reduced image is left, as in PIL's Image.thumbnail:
+# a final LANCZOS pass from twice the size is as sharp as one from the full scan.
+REDUCING_GAP = 2.0
+# Source pixels widened at a time while reducing.
+BAND_PIXELS = 1 << 18
+# Below this PIL decodes the whole scan and reduces it as fast as the mapped path does.
+MAPPED_MIN_PIXELS = 8_000_000
+
+def reduce_factors(width, height, size, reducing_gap=REDUCING_GAP):
+    # The integer factors Image.resize(..., reducing_gap=) reduces by before resampling.
+    tw, th = size
+    return int(width / tw / reducing_gap) or 1, int(height / th / reducing_gap) or 1
+
+def _block_sums(np, a, factor, dtype):
+    # Sums of `factor` consecutive rows of `a`, one strided add per row of the block; a
+    # short last block is summed as it is.
+    sums = a[::factor].astype(dtype)
+    for k in range(1, factor):
+        part = a[k::factor]
+        sums[:len(part)] += part
+    return sums
+
+def decode_reduced(path, size, reducing_gap=REDUCING_GAP):
+    # Averages whole blocks of an uncompressed BMP straight from the mapped file, leaving
+    # an image at most reducing_gap times larger than `size` for the final resize.
+    # Returns the RGB pixels and the box of the source in them, as Image.resize takes
+    # it, or None when the file needs the PIL path or is small enough for it.
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+
+    with open(path, "rb") as f:
+        header = read_header(f)
+        if header is None:
+            return None
+        offset, width, height, bpp = header
+        rows = abs(height)
+        fx, fy = reduce_factors(width, rows, size, reducing_gap)
+        if width * rows < MAPPED_MIN_PIXELS or (fx == 1 and fy == 1):
+            return None
+        channels = bpp // 8
+        stride = (width * bpp + 31) // 32 * 4
+        if f.seek(0, 2) < offset + stride * rows:
+            return None
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            raster = np.frombuffer(mapped, np.uint8, count=stride * rows, offset=offset).reshape(rows, stride)
+            pixels = raster[:, :width * channels].reshape(rows, width, channels)
+            if height > 0:
+                # Bottom-up rows are the usual layout. Flip the view before banding so the
+                # blocks are cut from the top of the image, as PIL does.
+                pixels = pixels[::-1]
+            out_h, out_w = -(-rows // fy), -(-width // fx)
+            # 16 bits hold the rounded mean of up to 256 pixels and halve the memory traffic.
+            dtype = np.uint16 if fx * fy <= 256 else np.uint32
+            sums = np.empty((out_h, out_w, 3), dtype)
+            # A band of whole blocks at a time: only that part of the file is touched and widened.
+            step = max(1, BAND_PIXELS // (width * fy))
+            try:
+                for band in range(0, out_h, step):
+                    band_rows = _block_sums(np, pixels[band * fy:(band + step) * fy, :, :3], fy, dtype)
+                    sums[band:band + step] = _block_sums(np, band_rows.swapaxes(0, 1), fx, dtype).swapaxes(0, 1)
+            finally:
+                del raster, pixels
+
+    heights = np.minimum(fy, rows - np.arange(out_h) * fy)
+    widths = np.minimum(fx, width - np.arange(out_w) * fx)
+    area = np.outer(heights, widths).astype(dtype)[:, :, None]
+    reduced = (sums + area // 2) // area
+    # BGR on disk.
+    return np.ascontiguousarray(reduced[:, :, ::-1], dtype=np.uint8), (0, 0, width / fx, rows / fy)
@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from app.functions import iso_date
+from app.parser import parse_and_detect
+from app.systemConfig import get_config_by_system, BEST_MODE_FILE, SYSTEM_AUTO, SYSTEM_CHOICES
+from app.validation_engine import compile_rules
+
+COMPARE_PARAMS = (
+    "extractor", "condensor", "drift", "magnet", "focus", "ratio",
+    "sample_current_work", "sample_current_max", "sample_current_aim",
+)
+COMPARE_PDF = "Compare_runs.pdf"
+NAN = float("nan")
+
+def _numpy():
+    # numpy is only needed here and in the BMP fast path, so it stays optional for the app.
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("Comparing runs needs numpy (pip install numpy)") from None
+    return numpy
+
+def load_run(folder, system_hint=SYSTEM_AUTO):
+    np = _numpy()
+    path = os.path.join(folder, BEST_MODE_FILE)
+    system, flags, detection = parse_and_detect(path, system_hint=system_hint)
+    if system is None or detection.system is None:
+        raise ValueError(f"{path}: no measurements or unknown system")
+
+    size = detection.rows + 1
+    table = system.results
+    positions = [None] * size
+    for pos, i in enumerate(table.mode_index):
+        if 0 <= i < size:
+            positions[i] = pos
+    present = np.array([pos is not None for pos in positions])
+    rows = np.array([pos for pos in positions if pos is not None], dtype=np.intp)
+
+    # One dense row per parameter, indexed by mode; missing modes are NaN.
+    columns = {}
+    for param in COMPARE_PARAMS:
+        column = np.full(size, NAN)
+        column[present] = np.asarray(table.column(param), dtype=float)[rows]
+        columns[param] = column
+
+    return {
+        "folder": folder,
+        "system_type": detection.system,
+        "run_date": iso_date(system.name),
+        "columns": columns,
+    }
+
+def load_runs(folders, system_hint=SYSTEM_AUTO, workers=None):
+    if workers == 1 or len(folders) <= 1:
+        runs = [load_run(f, system_hint) for f in folders]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            runs = list(pool.map(load_run, folders, [system_hint] * len(folders)))
+    # Oldest first; undated runs keep the order they were given in.
+    return sorted(runs, key=lambda r: (r["run_date"] is None, r["run_date"] or ""))
+
+def _rule_widths(system_type, size):
+    np = _numpy()
+    widths = {}
+    try:
+        limits = compile_rules(system_type).limits
+    except Exception:
+        return widths
+    for param, (mins, maxs, keys, _) in limits.items():
+        known = np.array([key is not None for key in keys[:size]])
+        widths[param] = np.where(known, np.asarray(maxs[:size]) - np.asarray(mins[:size]), NAN)
+    return widths
+
+def _last_finite(finite):
+    # Run index of the last True in each column of a (runs, modes) mask.
+    return finite.shape[0] - 1 - finite[::-1].argmax(axis=0)
+
+def compare_runs(runs):
+    if len(runs) < 2:
+        raise ValueError("Need at least two runs to compare")
+    systems = {r["system_type"] for r in runs}
+    if len(systems) != 1:
+        raise ValueError(f"Runs are from different systems: {', '.join(sorted(systems))}")
+    np = _numpy()
+    system_type = systems.pop()
+    size = get_config_by_system(system_type)["rows"] + 1
+    widths = _rule_widths(system_type, size)
+    modes = np.arange(size)
+    # The regression runs over run positions, so a run that lacks a mode leaves a gap.
+    x = np.arange(len(runs), dtype=float)[:, None]
+
+    stats = []
+    for param in COMPARE_PARAMS:
+        # (runs, modes); every statistic below is taken over all modes at once,
+        # using only the runs in which a mode was measured.
+        grid = np.stack([r["columns"][param] for r in runs])
+        finite = ~np.isnan(grid)
+        count = finite.sum(axis=0)
+        values = np.where(finite, grid, 0.0)
+
+        first_run = np.argmax(finite, axis=0)
+        last_run = _last_finite(finite)
+        before_last = finite.copy()
+        before_last[last_run, modes] = False
+        previous_run = _last_finite(before_last)
+
+        first = grid[first_run, modes]
+        last = grid[last_run, modes]
+        previous = grid[previous_run, modes]
+
+        n = np.maximum(count, 1)
+        mean = values.sum(axis=0) / n
+        deviation = np.where(finite, grid - mean, 0.0)
+        stdev = np.sqrt((deviation ** 2).sum(axis=0) / np.maximum(count - 1, 1))
+        x_mean = (x * finite).sum(axis=0) / n
+        x_deviation = np.where(finite, x - x_mean, 0.0)
+        x_var = (x_deviation ** 2).sum(axis=0)
+        slope = (x_deviation * deviation).sum(axis=0) / np.where(x_var > 0, x_var, 1.0)
+
+        moved = last - first
+        width = widths.get(param, np.full(size, NAN))
+        by_rule = width > 0
+        scale = np.where(by_rule, width, np.maximum(np.maximum(np.abs(first), np.abs(last)), 1.0))
+        score = np.abs(moved) / scale
+
+        for i in np.flatnonzero(count >= 2):
+            stats.append({
+                "mode": f"[{i:02d}]",
+                "param": param,
+                "first": float(first[i]),
+                "previous": float(previous[i]),
+                "last": float(last[i]),
+                "delta": float(last[i] - previous[i]),
+                "delta_total": float(moved[i]),
+                "mean": float(mean[i]),
+                "stdev": float(stdev[i]),
+                "slope_per_run": float(slope[i]),
+                "score": float(score[i]),
+                "scaled_by": "rule window" if by_rule[i] else "value",
+            })
+
+    stats.sort(key=lambda s: s["score"], reverse=True)
+    return {
+        "system_type": system_type,
+        "runs": [{"folder": r["folder"], "run_date": r["run_date"]} for r in runs],
+        "stats": stats,
+    }
+
+def export_comparison_pdf(comparison, output_dir, top=40):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import landscape, A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    pdf_path = os.path.join(output_dir, COMPARE_PDF)
+    doc = SimpleDocTemplate(pdf_path, pagesize=landscape(A4), topMargin=30)
+    styles = getSampleStyleSheet()
+
+    story = [
+        Paragraph(f"{comparison['system_type']}: {len(comparison['runs'])} runs compared", styles["Title"]),
+        Paragraph(" &rarr; ".join(
+            f"{os.path.basename(os.path.normpath(r['folder']))} ({r['run_date'] or 'undated'})" for r in comparison["runs"]
+        ), styles["Normal"]),
+        Spacer(1, 8),
+    ]
+
+    data = [["Mode", "Parameter", "First", "Previous", "Last", "Δ last", "Δ total", "Mean", "Stdev", "Slope/run", "Score"]]
+    for s in comparison["stats"][:top]:
+        data.append([
+            s["mode"], s["param"],
+            f"{s['first']:g}", f"{s['previous']:g}", f"{s['last']:g}",
+            f"{s['delta']:+g}", f"{s['delta_total']:+g}",
+            f"{s['mean']:.4g}", f"{s['stdev']:.3g}", f"{s['slope_per_run']:+.3g}", f"{s['score']:.2f}",
+        ])
+
+    table = Table(data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
+    ]))
+    story.append(table)
+    doc.build(story)
+    return pdf_path
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Compare BestModeData runs of one system and rank the modes that moved most.")
+    parser.add_argument("folders", nargs="+", help="Run folders, oldest to newest if the logs carry no dates")
+    parser.add_argument("--system", choices=tuple(SYSTEM_CHOICES), default="auto")
+    parser.add_argument("--out", default=".", help="Folder for Compare_runs.pdf")
+    parser.add_argument("--top", type=int, default=40, help="Rows in the PDF report")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print every statistic as JSON instead of writing a PDF")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    hint = SYSTEM_CHOICES[args.system]
+    try:
+        comparison = compare_runs(load_runs(args.folders, hint, args.workers))
+    except (OSError, ValueError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        return 3
+
+    if args.json:
+        print(json.dumps(comparison, indent=2))
+    else:
+        print(export_comparison_pdf(comparison, args.out, args.top))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import csv
+import json
+import os
+
+from models.measurement_table import MeasurementTable, NUMERIC_COLUMNS, TEXT_COLUMNS
+
+from app.functions import show_error as _show_error
+from app.validation_engine import rules_for_flags, wrong_modes_of
+from app.instrumentation import span
+
+DATA_FORMATS = ("csv", "json", "parquet")
+BASE_NAME = "BestModeData_V3"
+ROW_COLUMNS = ("mode_index",) + TEXT_COLUMNS + NUMERIC_COLUMNS
+VIOLATION_COLUMNS = ("mode_index", "index", "param", "min", "max")
+
+def _rows(table):
+    columns = [table.column(name) for name in ROW_COLUMNS[1:]]
+    for pos, mode_index in enumerate(table.mode_index):
+        yield (mode_index,) + tuple(c[pos] for c in columns)
+
+def _violation_rows(violations):
+    for v in violations:
+        lo, hi = v.range if v.range else (None, None)
+        yield (v.mode_index, v.index, v.param, lo, hi)
+
+def write_csv(table, violations, output_dir):
+    rows_path = os.path.join(output_dir, f"{BASE_NAME}.csv")
+    with open(rows_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(ROW_COLUMNS)
+        writer.writerows(_rows(table))
+
+    violations_path = os.path.join(output_dir, f"{BASE_NAME}_violations.csv")
+    with open(violations_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(VIOLATION_COLUMNS)
+        writer.writerows(_violation_rows(violations))
+    return [rows_path, violations_path]
+
+def write_json(table, violations, meta, output_dir):
+    path = os.path.join(output_dir, f"{BASE_NAME}.json")
+    data = dict(meta)
+    data["columns"] = list(ROW_COLUMNS)
+    data["rows"] = [list(row) for row in _rows(table)]
+    data["violations"] = [dict(zip(VIOLATION_COLUMNS, v)) for v in _violation_rows(violations)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    return [path]
+
+def write_parquet(table, violations, meta, output_dir):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    columns = {"mode_index": pa.array(list(table.mode_index), pa.int32())}
+    for name in TEXT_COLUMNS:
+        columns[name] = pa.array(list(table.column(name)), pa.string())
+    for name in NUMERIC_COLUMNS:
+        columns[name] = pa.array(list(table.column(name)), pa.float64())
+    rows = pa.table(columns).replace_schema_metadata({k: str(v) for k, v in meta.items()})
+
+    # Typed explicitly: a run without violations would otherwise give null columns.
+    violation_schema = pa.schema([
+        ("mode_index", pa.int32()),
+        ("index", pa.string()),
+        ("param", pa.string()),
+        ("min", pa.float64()),
+        ("max", pa.float64()),
+    ])
+    violation_rows = list(_violation_rows(violations))
+    violation_table = pa.table(
+        {name: [v[i] for v in violation_rows] for i, name in enumerate(VIOLATION_COLUMNS)},
+        schema=violation_schema,
+    )
+
+    rows_path = os.path.join(output_dir, f"{BASE_NAME}.parquet")
+    violations_path = os.path.join(output_dir, f"{BASE_NAME}_violations.parquet")
+    pq.write_table(rows, rows_path)
+    pq.write_table(violation_table, violations_path)
+    return [rows_path, violations_path]
+
+def export_txt_to_data(system, output_dir, system_var: bool, ionGun_var: bool, isISS: bool, isOE: bool, formats=("csv", "json"), on_error=None):
+    show_error = on_error or _show_error
+
+    unknown = set(formats) - set(DATA_FORMATS)
+    if unknown:
+        show_error("Error", f"Unknown export format: {', '.join(sorted(unknown))}")
+        return None, []
+
+    compiled = rules_for_flags(system_var, ionGun_var, isISS, show_error)
+    if compiled is None:
+        return None, []
+    system_type = compiled.system_type
+
+    results = system.results
+    if not isinstance(results, MeasurementTable):
+        results = MeasurementTable.from_measurements(results)
+
+    with span("validation"):
+        violations = compiled.evaluate(results).violations
+
+    # "row_count", not "rows": the JSON export keeps the rows themselves under "rows".
+    meta = {"system": system_type, "header": system.name, "oe": isOE, "row_count": len(results)}
+    written = []
+    try:
+        with span("data_export", formats=list(formats)):
+            if "csv" in formats:
+                written += write_csv(results, violations, output_dir)
+            if "json" in formats:
+                written += write_json(results, violations, meta, output_dir)
+            if "parquet" in formats:
+                written += write_parquet(results, violations, meta, output_dir)
+    except (OSError, RuntimeError) as e:
+        show_error("Export failed", str(e))
+        return None, written
+
+    return wrong_modes_of(violations), written
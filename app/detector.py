@@ -0,0 +1,104 @@
+from collections import namedtuple
+
+from models.measurement_table import mode_index_of
+
+from app.systemConfig import SYSTEM_CONFIG
+
+# ISS cluster rows: each cluster setup only appears at these mode indexes on ISS systems.
+ISS_CLUSTER_SETUPS = {
+    "75": ("[14]", "[20]", "[26]", "[32]"),
+    "150": ("[15]", "[21]", "[27]", "[33]"),
+    "300": ("[16]", "[22]", "[28]", "[34]"),
+    "500": ("[17]", "[23]", "[29]", "[35]"),
+    "1000": ("[18]", "[24]", "[30]", "[36]"),
+    "2000": ("[19]", "[25]", "[31]", "[37]"),
+}
+ISS_SIGNATURES = frozenset(
+    (index, setup) for setup, indexes in ISS_CLUSTER_SETUPS.items() for index in indexes
+)
+
+# Escalab logs never go past this mode index; anything higher is a Nexsa.
+ESCALAB_MAX_INDEX = max(cfg["rows"] for key, cfg in SYSTEM_CONFIG.items() if not key[0])
+
+Detection = namedtuple("Detection", "key system rows flags evidence")
+Signature = namedtuple("Signature", "index setup extractor magnet mode")
+
+def row_signature(parts):
+    return Signature(parts[0], parts[3], parts[9], parts[12], parts[20])
+
+def _row_effect(sig):
+    # Returns (ion_gun, iss) for one row; ion_gun is None when the row says nothing.
+    # Later rows override earlier ones, and within a row the checks apply in this order.
+    iss_cluster = (sig.index, sig.setup) in ISS_SIGNATURES
+    if sig.mode == "Cluster":
+        ion_gun = (True, "Cluster mode")
+    elif sig.setup == "Med":
+        ion_gun = (False, "Med setup")
+    elif iss_cluster:
+        ion_gun = (True, f"ISS cluster setup {sig.setup}")
+    elif sig.extractor != "0" and sig.magnet != "-0":
+        ion_gun = (True, "extractor/magnet in use")
+    else:
+        ion_gun = None
+
+    if iss_cluster:
+        iss = f"ISS cluster setup {sig.setup}"
+    elif sig.mode == "ISS":
+        iss = "ISS mode"
+    else:
+        iss = None
+    return ion_gun, iss
+
+def detect_system(signatures, system_hint=None):
+    ion_gun = iss = None
+    max_index = -1
+    evidence = {}
+
+    # Walking backwards, the first row with an ion-gun effect is the one that wins,
+    # and once an ISS row has been seen nothing earlier can change the result.
+    for sig in reversed(signatures):
+        try:
+            max_index = max(max_index, mode_index_of(sig.index))
+        except ValueError:
+            pass
+        gun_effect, iss_effect = _row_effect(sig)
+        if ion_gun is None and gun_effect is not None:
+            ion_gun = gun_effect[0]
+            evidence["ion_gun"] = f"{sig.index}: {gun_effect[1]}"
+        if iss is None and iss_effect is not None:
+            iss = True
+            evidence["iss"] = f"{sig.index}: {iss_effect}"
+        if ion_gun is not None and iss:
+            break
+
+    ion_gun = bool(ion_gun)
+    iss = bool(iss)
+
+    if iss:
+        nexsa = True
+        evidence["system"] = "ISS modes only exist on Nexsa"
+    elif max_index > ESCALAB_MAX_INDEX:
+        nexsa = True
+        evidence["system"] = f"mode index {max_index} is past the Escalab range"
+    elif system_hint is not None:
+        nexsa = bool(system_hint)
+        evidence["system"] = "selected by user"
+    else:
+        nexsa = False
+        evidence["system"] = "no Nexsa-only modes, assuming Escalab"
+
+    key = (nexsa, ion_gun, iss)
+    cfg = SYSTEM_CONFIG.get(key)
+    return Detection(
+        key,
+        cfg["system"] if cfg else None,
+        cfg["rows"] if cfg else None,
+        {"ion_gun": ion_gun, "iss": iss},
+        evidence,
+    )
+
+def detect_file(path, system_hint=None, encoding=None):
+    from app.parser import iter_records, RECORD_ROW
+
+    signatures = [row_signature(value) for kind, value in iter_records(path, encoding) if kind == RECORD_ROW]
+    return detect_system(signatures, system_hint)
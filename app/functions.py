@@ -1,5 +1,10 @@
+import hashlib
 import os
 import sys
+from datetime import datetime
+
+# Date layouts accepted in BestModeData headers and rows, tried in order.
+DATE_FORMATS = ("%d/%m/%Y %H:%M:%S", "%d.%m.%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y")
 
 def resource_path(relative_path):
     try:
@@ -18,4 +23,35 @@ def point_in_polygon(x, y, poly):
             xinters = (y - y1) * (x2 - x1) / (y2 - y1) + x1
             if x < xinters:
                 inside = not inside
-    return inside
\ No newline at end of file
+    return inside
+
+def show_error(title, message):
+    # Tk is only loaded when an error has to be shown; batch runs pass their own on_error.
+    from tkinter import messagebox
+    messagebox.showerror(title, message)
+
+def cache_dir():
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, "IONify")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def iso_date(text):
+    # "Date 03/02/2025 14:05:00" or a bare date in one of DATE_FORMATS -> "2025-02-03 14:05:00";
+    # None when no format matches.
+    text = (text or "").strip()
+    if text.startswith("Date"):
+        text = text[4:].strip(" :")
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).isoformat(sep=" ")
+        except ValueError:
+            continue
+    return None
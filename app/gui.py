@@ -1,22 +1,57 @@
 import os
+import queue
+import threading
 
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-from charset_normalizer import from_path
 from PIL import Image as PILImage
 
-from models.systemName import System
-from models.measurement import Measurement
-from models.image import Image
+from app.jobs import BackgroundJob, EVENT_PROGRESS, EVENT_DONE, EVENT_ERROR, EVENT_CANCELLED
+from app.functions import resource_path
+from app.image_profiles import IMAGE_PROFILES, DEFAULT_PROFILE
+from app.selector import HitMap, DESIGN_SIZE, REGIONS
+from app.systemConfig import get_system_config, TABLE_PDF
 
-from app.pdf_images import export_images_to_pdf
-from app.pdf_table import export_txt_to_pdf
-from app.functions import resource_path, point_in_polygon
-from app.systemConfig import get_system_config
+# ReportLab, charset_normalizer and the PDF exporters are imported on first use so
+# that the window can appear without loading them.
+def _generate_reports(folder_path, system_var, image_profile=None, progress=None):
+    from app.pipeline import process_folder
+    return process_folder(folder_path, system_var, progress=progress, image_profile=image_profile)
+
+def _watch_folder(folder_path, system_var, image_profile, on_result, stop_event):
+    from app.watch import FolderWatcher
+
+    watcher = FolderWatcher(folder_path, system_var, on_result=on_result, image_profile=image_profile)
+    try:
+        watcher.mark_current()
+    except OSError:
+        pass
+    watcher.run(stop_event=stop_event)
 
 class App(ctk.CTk):
     BG_COLOR = "#2B2B2B"   
     BG_COLOR_HOVER ="#5E5D5D"
+    JOB_POLL_MS = 100
+    PRELOAD_DELAY_MS = 300
+    MOTION_INTERVAL_MS = 30
+    # How long stopping the watch waits for a rebuild that is still running.
+    WATCH_JOIN_S = 10.0
+
+    BACKGROUNDS = {
+        False: "assets/EscalabSelected2.png",
+        True: "assets/NexsaSelected2.png",
+    }
+
+    # stage -> (label, progress at stage start, progress at stage end)
+    STAGES = {
+        "images": ("Creating image thumbnails", 0.0, 0.6),
+        "images_pdf": ("Building Ion_gun_maps.pdf", 0.6, 0.7),
+        "parse": ("Reading BestModeData_V3.txt", 0.7, 0.75),
+        "data": ("Exporting table data", 0.75, 0.8),
+        "table_pdf": ("Building BestModeData_V3.pdf", 0.8, 1.0),
+        # Both reports built side by side in worker processes.
+        "reports": ("Building reports", 0.0, 1.0),
+    }
     
     def __init__(self):
         super().__init__()
@@ -36,9 +71,17 @@ class App(ctk.CTk):
         self.ionGun_var = ctk.BooleanVar(value=False)  # MAGCIS / EX06
         self.ISS_modes = ctk.BooleanVar(value=False)   # ISS modes for Nexsa
         self.oe_access = ctk.BooleanVar(value=False)   
-
-        self.ORIGINAL_DESIGN_WIDTH = 892
-        self.ORIGINAL_DESIGN_HEIGHT = 501
+        self._job = None
+        self.watch_var = ctk.BooleanVar(value=False)
+        self.image_profile_var = ctk.StringVar(value=DEFAULT_PROFILE)
+        self._watch_stop = None
+        self._watch_thread = None
+        self._watch_results = queue.Queue()
+
+        self.ORIGINAL_DESIGN_WIDTH, self.ORIGINAL_DESIGN_HEIGHT = DESIGN_SIZE
+        self._hit_maps = {}
+        self._motion_xy = None
+        self._motion_after = None
 
         self._load_images()
         self._create_background()
@@ -46,22 +89,54 @@ class App(ctk.CTk):
         self._current_cursor = ""
         self.bg_label.bind("<Motion>", self.on_motion)
         self.bg_label.bind("<Leave>", self.on_leave)
+        self.bg_label.bind("<Configure>", self._on_bg_configure)
 
         self._create_title_area()
         self._create_tooltip()
         self._create_buttons()
+        self._create_progress()
 
-    def _load_ctk_image(self, relpath: str, size: tuple):
+        self.after(self.PRELOAD_DELAY_MS, self._preload_backgrounds)
+
+    def _load_ctk_image(self, relpath: str, size: tuple, scaling: float = None):
         p = resource_path(relpath)
         try:
             pil = PILImage.open(p)
+            if scaling:
+                # Resized once here, so customtkinter's own resize at this DPI is a plain copy.
+                scaled = (int(size[0] * scaling), int(size[1] * scaling))
+                with pil:
+                    pil = pil.resize(scaled, PILImage.LANCZOS)
             return ctk.CTkImage(pil, size=size)
         except Exception:
             return None
-        
+
+    def _image_scaling(self):
+        return ctk.ScalingTracker.get_widget_scaling(self)
+
+    def _get_background(self, nexsa: bool):
+        # One image per system and DPI; moving to another monitor only scales what it has not seen.
+        key = (nexsa, self._image_scaling())
+        if key not in self._backgrounds:
+            self._backgrounds[key] = self._load_ctk_image(
+                self.BACKGROUNDS[nexsa], (self.ORIGINAL_DESIGN_WIDTH, self.ORIGINAL_DESIGN_HEIGHT), key[1]
+            )
+        return self._backgrounds[key]
+
+    @property
+    def bg_escalab_img(self):
+        return self._get_background(False)
+
+    @property
+    def bg_nexsa_img(self):
+        return self._get_background(True)
+
+    def _preload_backgrounds(self):
+        # Decode the background that is not shown yet once the window is up, so the first switch is instant.
+        self._get_background(not self.system_var.get())
+
     def _load_images(self):
-        self.bg_escalab_img = self._load_ctk_image("assets/EscalabSelected2.png", (892, 501))
-        self.bg_nexsa_img   = self._load_ctk_image("assets/NexsaSelected2.png", (892, 501))
+        self._backgrounds = {}
         self.icon_normal    = self._load_ctk_image("assets/info_icon_normal.png", (20, 20))
         self.icon_hover     = self._load_ctk_image("assets/hover2.png", (20, 20))
 
@@ -147,6 +222,18 @@ class App(ctk.CTk):
         )
         self.upload_button.pack(side="left", padx=5)
 
+        self.profile_menu = ctk.CTkOptionMenu(
+            button_frame,
+            values=list(IMAGE_PROFILES),
+            variable=self.image_profile_var,
+            fg_color="#3A3A3A",
+            button_color="#3A3A3A",
+            button_hover_color=self.BG_COLOR_HOVER,
+            corner_radius=3,
+            width=100
+        )
+        self.profile_menu.pack(side="left", padx=5)
+
         self.open_button = ctk.CTkButton(
             button_frame,
             text="Open Folder",
@@ -169,6 +256,24 @@ class App(ctk.CTk):
         )
         self.default_data_button.pack_forget()
 
+        self.watch_switch = ctk.CTkSwitch(
+            button_frame,
+            text="Auto-rebuild",
+            variable=self.watch_var,
+            command=self._toggle_watch,
+            text_color="white"
+        )
+        self.watch_switch.pack_forget()
+
+        self.watch_label = ctk.CTkLabel(
+            button_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color="white",
+            fg_color=self.BG_COLOR
+        )
+        self.watch_label.pack_forget()
+
     def _on_info_hover(self, event):
         self.info_button.configure(image=self.icon_hover)
         x = self.info_button.winfo_rootx() + self.info_button.winfo_width() + 6
@@ -186,12 +291,43 @@ class App(ctk.CTk):
         else:  # Escalab
             self.bg_label.configure(image=self.bg_escalab_img)
 
+    def _create_progress(self):
+        self.progress_frame = ctk.CTkFrame(self, fg_color=self.BG_COLOR)
+
+        self.progress_label = ctk.CTkLabel(
+            self.progress_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color="white",
+            fg_color=self.BG_COLOR
+        )
+        self.progress_label.pack(side="left", padx=5)
+
+        self.progress_bar = ctk.CTkProgressBar(self.progress_frame, width=250)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(side="left", padx=5)
+
+        self.cancel_button = ctk.CTkButton(
+            self.progress_frame,
+            text="Cancel",
+            hover_color=self.BG_COLOR_HOVER,
+            fg_color="#3A3A3A",
+            command=self.cancel_job,
+            corner_radius=3,
+            width=80
+        )
+        self.cancel_button.pack(side="left", padx=5)
+
     def import_folder(self):
+        if self._job is not None and self._job.is_alive():
+            return
+        self._stop_watch()
+
         self.system = []
         self.images = []
         self.import_folder_path = ""
-        self.ionGun_var = ctk.BooleanVar(value=False)  # MAGCIS / EX06
-        self.ISS_modes = ctk.BooleanVar(value=False)   # ISS modes for Nexsa
+        self.ionGun_var.set(False)  # MAGCIS / EX06
+        self.ISS_modes.set(False)   # ISS modes for Nexsa
         self.oe_access.set(False)
 
         try:
@@ -201,29 +337,149 @@ class App(ctk.CTk):
                 return
             self.import_folder_path = folder_path
 
-            bmp_files = [f for f in os.listdir(folder_path) if f.lower().endswith(".bmp")]
-            for bmp_file in bmp_files:
-                full_path = os.path.join(folder_path, bmp_file)
-                self.images.append(Image(bmp_file, full_path))
-
-            if self.images:
-                export_images_to_pdf(self.images, self.import_folder_path)
-
-            txt_path = os.path.join(folder_path, "BestModeData_V3.txt")
-            if os.path.isfile(txt_path):
-                if self.process_file(txt_path):
-                    self.open_folder()
-                    self.open_button.pack(side="left", padx=5)
-                    self.default_data_button.pack(side="left", padx=5)
-                else:
-                    messagebox.showwarning("Warning", "Best Mode Data file not found.")
+            self._job = BackgroundJob(
+                _generate_reports, folder_path, self.system_var.get(), self.image_profile_var.get()
+            ).start()
+            self._show_progress()
+            self.after(self.JOB_POLL_MS, self._poll_job)
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def cancel_job(self):
+        if self._job is not None:
+            self._job.cancel()
+            self.cancel_button.configure(state="disabled")
+            self.progress_label.configure(text="Cancelling...")
+
+    def _show_progress(self):
+        self.upload_button.configure(state="disabled")
+        self.cancel_button.configure(state="normal")
+        self.progress_bar.set(0)
+        self.progress_label.configure(text="Starting...")
+        self.progress_frame.pack(pady=5)
+
+    def _hide_progress(self):
+        self.progress_frame.pack_forget()
+        self.upload_button.configure(state="normal")
+
+    def _update_progress(self, stage, done, total):
+        label, start, end = self.STAGES.get(stage, (stage, 0.0, 0.0))
+        if done is not None and total:
+            self.progress_bar.set(start + (end - start) * done / total)
+            label = f"{label} ({done}/{total})"
+        else:
+            self.progress_bar.set(start)
+        self.progress_label.configure(text=label)
+
+    def _poll_job(self):
+        job = self._job
+        for kind, payload in job.drain():
+            if kind == EVENT_PROGRESS:
+                if not job.cancelled:
+                    self._update_progress(*payload)
+                continue
+
+            self._hide_progress()
+            if kind == EVENT_DONE:
+                self._on_report_done(payload)
+            elif kind == EVENT_ERROR:
+                messagebox.showerror("Error", str(payload))
+            elif kind == EVENT_CANCELLED:
+                messagebox.showinfo("Cancelled", "Report generation was cancelled.")
+            return
+
+        self.after(self.JOB_POLL_MS, self._poll_job)
+
+    def _publish_flags(self, flags):
+        self.ionGun_var.set(flags["ion_gun"])
+        self.ISS_modes.set(flags["iss"])
+        self.oe_access.set(flags["oe"])
+
+    def _on_report_done(self, result):
+        from app.pipeline import STATUS_NO_DATA
+
+        flags = result.get("flags")
+        if flags:
+            self._publish_flags(flags)
+
+        if result["table_pdf"] is None:
+            # A single dialog: the errors that stopped the table, or the missing log.
+            if result["errors"]:
+                messagebox.showerror("Error", "\n\n".join(result["errors"]))
+            elif result["status"] != STATUS_NO_DATA:
+                messagebox.showwarning("Warning", "Best Mode Data file not found.")
+            return
+        if result["errors"]:
+            messagebox.showerror("Error", "\n\n".join(result["errors"]))
+
+        if not result["wrong_modes"]:
+            self.open_file()
+        else:
+            lines = ["Please check values:"]
+            lines += [f"Mode {i[0]}: {i[1]} value" for i in result["wrong_modes"]]
+            messagebox.showwarning("Wrong Modes", "\n".join(lines))
+
+        self.open_folder()
+        self.open_button.pack(side="left", padx=5)
+        self.default_data_button.pack(side="left", padx=5)
+        self.watch_switch.pack(side="left", padx=5)
+
+    def _toggle_watch(self):
+        if self.watch_var.get():
+            self._start_watch()
+        else:
+            self._stop_watch()
+
+    def _start_watch(self):
+        # Rebuilds the reports of the last processed folder whenever its inputs change.
+        if not os.path.isdir(self.import_folder_path):
+            self.watch_var.set(False)
+            return
+        self._watch_stop = threading.Event()
+        self._watch_thread = threading.Thread(
+            target=_watch_folder,
+            args=(self.import_folder_path, self.system_var.get(), self.image_profile_var.get(),
+                  self._watch_results.put, self._watch_stop),
+            daemon=True
+        )
+        self._watch_thread.start()
+        self.watch_label.configure(text="Watching for changes")
+        self.watch_label.pack(side="left", padx=5)
+        self.after(self.JOB_POLL_MS, self._poll_watch)
+
+    def _stop_watch(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+        if self._watch_thread is not None:
+            # A rebuild that is still running would overlap with the next report.
+            self._watch_thread.join(self.WATCH_JOIN_S)
+            self._watch_thread = None
+        self.watch_var.set(False)
+        self.watch_label.pack_forget()
+
+    def _poll_watch(self):
+        stop = self._watch_stop
+        if stop is None:
+            return
+        while True:
+            try:
+                result = self._watch_results.get_nowait()
+            except queue.Empty:
+                break
+            if result["errors"]:
+                text = f"Rebuild failed: {result['errors'][0]}"
+            else:
+                text = f"Rebuilt {', '.join(result['rebuilt'])}"
+                if result["wrong_modes"]:
+                    text += f" ({len(result['wrong_modes'])} wrong modes)"
+            self.watch_label.configure(text=text)
+        self.after(self.JOB_POLL_MS, self._poll_watch)
+
     def open_file(self):
         try:
-            txt_path = os.path.join(self.import_folder_path, "BestModeData_V3.pdf")
+            txt_path = os.path.join(self.import_folder_path, TABLE_PDF)
             os.startfile(txt_path)
         except Exception as e:
             None
@@ -237,98 +493,6 @@ class App(ctk.CTk):
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
-    def process_file(self, file=None):
-        self.system = []
-        try:
-            encoding = from_path(file).best().encoding
-            with open(file, "r", encoding=encoding) as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue                 
-                    if line == "isolemnlyswearthatiamuptonogood" or line == "slavnostneprisahamzejsempripravenkekazdespatnosti" or line == "slavnostneprisahamzenemamzalubomnicdobre":
-                        self.oe_access.set(True)
-                    if line.startswith("Date"):
-                        self.system = System(line)
-                    else:
-                        parts = line.split()
-                        if len(parts) < 21:
-                            continue
-
-                        if parts[0] in ("[14]", "[20]", "[26]", "[32]") and parts[3] == "75":
-                            self.ISS_modes.set(True)
-                            self.ionGun_var.set(True)
-                        elif parts[0] in ("[15]", "[21]", "[27]", "[33]") and parts[3] == "150":
-                            self.ISS_modes.set(True)
-                            self.ionGun_var.set(True)
-                        elif parts[0] in ("[16]", "[22]", "[28]", "[34]") and parts[3] == "300":
-                            self.ISS_modes.set(True)
-                            self.ionGun_var.set(True)
-                        elif parts[0] in ("[17]", "[23]", "[29]", "[35]") and parts[3] == "500":
-                            self.ISS_modes.set(True)
-                            self.ionGun_var.set(True)
-                        elif parts[0] in  ("[18]", "[24]", "[30]", "[36]") and parts[3] == "1000":
-                            self.ISS_modes.set(True)
-                            self.ionGun_var.set(True)
-                        elif parts[0] in  ("[19]", "[25]", "[31]", "[37]") and parts[3] == "2000":
-                            self.ionGun_var.set(True)
-                            self.ISS_modes.set(True)                     
-
-                        if parts[9] != "0" and parts[12] != "-0":
-                            self.ionGun_var.set(True)
-
-                        if parts[3] == "Med":
-                            self.ionGun_var.set(False)
-                        if parts[20] == "ISS":
-                            self.ISS_modes.set(True)
-                        if parts[20] == "Cluster":
-                            self.ionGun_var.set(True)
-                        else:
-                            pass
-
-                        self.system.results.append(
-                            Measurement(
-                                date=parts[1] + " " + parts[2],
-                                index=parts[0],
-                                setup=parts[3],
-                                ion_energy_eV=float(parts[4]),
-                                ion_energy_uA=float(parts[5]),
-                                electron_energy_eV=float(parts[6]),
-                                electron_energy_mA=float(parts[7]),
-                                fil=float(parts[8]),
-                                extractor=float(parts[9]),
-                                condensor=float(parts[10]),
-                                drift=float(parts[11]),
-                                magnet=float(parts[12]),
-                                focus=float(parts[13]),
-                                X_shift=float(parts[14]),
-                                Y_shift=float(parts[15]),
-                                ratio=float(parts[16]),
-                                sample_current_work=float(parts[17]),
-                                sample_current_max=float(parts[18]),
-                                sample_current_aim=float(parts[19]),
-                                mode=parts[20],
-                                specification=parts[21] if len(parts) > 21 else ""
-                            )
-                        )
-            
-            wrong_modes = export_txt_to_pdf(self.system, self.import_folder_path, self.system_var.get(), self.ionGun_var.get(), self.ISS_modes.get(), self.oe_access.get())
-            if wrong_modes is None:              
-                return False
-            elif wrong_modes == []:
-                self.open_file()
-            elif wrong_modes != []:
-                lines = ["Please check values:"]
-                lines += [f"Mode {i[0]}: {i[1]} value" for i in wrong_modes]
-                messagebox.showwarning("Wrong Modes", "\n".join(lines))
-            else:
-                pass
-                
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-
-        return True
-    
     def open_default_data(self):
         try:
             systemType = get_system_config(self.system_var.get(), self.ionGun_var.get(), self.ISS_modes.get())["system"]
@@ -343,51 +507,35 @@ class App(ctk.CTk):
         except Exception as e:
             messagebox.showerror("Error", f"Could not open the PDF file:\n{e}")
 
-    def _hit_test_region(self, event):
+    def _window_scaling(self):
         try:
-            scaling = self._get_window_scaling()
+            return self._get_window_scaling()
         except AttributeError:
-            scaling = ctk.ThemeManager.theme.get("scaling", 1.0)
-
-        cur_x = event.x / scaling
-        cur_y = event.y / scaling
-
-        widget_w = event.widget.winfo_width() / scaling
-        widget_h = event.widget.winfo_height() / scaling
-
-        offset_x = (widget_w - self.ORIGINAL_DESIGN_WIDTH) / 2
-        offset_y = (widget_h - self.ORIGINAL_DESIGN_HEIGHT) / 2
+            return ctk.ThemeManager.theme.get("scaling", 1.0)
+
+    def _set_scaling(self, new_widget_scaling, new_window_scaling):
+        super()._set_scaling(new_widget_scaling, new_window_scaling)
+        # Called on DPI changes, also while the window is still being built.
+        self._hit_maps = {}
+        if getattr(self, "bg_label", None) is not None:
+            self.update_background()
+
+    def _on_bg_configure(self, event):
+        self._hit_maps.pop(event.widget, None)
+
+    def _region_at(self, widget, x, y):
+        # Events come from the label's inner widgets, each with its own size. A mask is
+        # only rebuilt after that widget is resized or the DPI changes.
+        hit_map = self._hit_maps.get(widget)
+        if hit_map is None:
+            hit_map = self._hit_maps[widget] = HitMap(
+                widget.winfo_width(), widget.winfo_height(), self._window_scaling(),
+                (self.ORIGINAL_DESIGN_WIDTH, self.ORIGINAL_DESIGN_HEIGHT), REGIONS
+            )
+        return hit_map.region_at(x, y)
 
-        if not (
-            offset_x <= cur_x <= offset_x + self.ORIGINAL_DESIGN_WIDTH and
-            offset_y <= cur_y <= offset_y + self.ORIGINAL_DESIGN_HEIGHT
-        ):
-            return None
-
-        virtual_x = cur_x - offset_x
-        virtual_y = cur_y - offset_y
-
-        poly_left = [
-            (0, self.ORIGINAL_DESIGN_HEIGHT),
-            (369, self.ORIGINAL_DESIGN_HEIGHT),
-            (468, 0),
-            (0, 0),
-        ]
-
-        poly_right = [
-            (369, self.ORIGINAL_DESIGN_HEIGHT),
-            (self.ORIGINAL_DESIGN_WIDTH, self.ORIGINAL_DESIGN_HEIGHT),
-            (self.ORIGINAL_DESIGN_WIDTH, 0),
-            (468, 0),
-        ]
-
-        if point_in_polygon(virtual_x, virtual_y, poly_left):
-            return "left"
-
-        if point_in_polygon(virtual_x, virtual_y, poly_right):
-            return "right"
-
-        return None
+    def _hit_test_region(self, event):
+        return self._region_at(event.widget, event.x, event.y)
     
     def on_click(self, event):
         region = self._hit_test_region(event)
@@ -401,7 +549,17 @@ class App(ctk.CTk):
             self.bg_label.configure(image=self.bg_nexsa_img)
 
     def on_motion(self, event):
-        region = self._hit_test_region(event)
+        # Only the latest position matters: handle it at most once per interval.
+        self._motion_xy = (event.widget, event.x, event.y)
+        if self._motion_after is None:
+            self._motion_after = self.after(self.MOTION_INTERVAL_MS, self._apply_motion)
+
+    def _apply_motion(self):
+        self._motion_after = None
+        if self._motion_xy is None:
+            return
+        region = self._region_at(*self._motion_xy)
+        self._motion_xy = None
 
         if region in ("left", "right"):
             self._set_cursor("hand2")
@@ -409,6 +567,7 @@ class App(ctk.CTk):
             self._set_cursor("arrow")
 
     def on_leave(self, event):
+        self._motion_xy = None
         self._set_cursor("arrow")
 
     def _set_cursor(self, cursor_name):
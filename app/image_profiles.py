@@ -0,0 +1,33 @@
+from collections import namedtuple
+
+# Kept free of PIL and ReportLab so the GUI and the CLI can list the profiles cheaply.
+
+ENCODING_FLATE = "flate"
+ENCODING_JPEG = "jpeg"
+
+ImageProfile = namedtuple("ImageProfile", "dpi encoding quality colors")
+
+IMAGE_PROFILES = {
+    "standard": ImageProfile(72, ENCODING_FLATE, None, None),
+    "archive": ImageProfile(144, ENCODING_FLATE, None, None),
+    "upload": ImageProfile(96, ENCODING_JPEG, 80, None),
+    "preview": ImageProfile(48, ENCODING_FLATE, None, 64),
+}
+DEFAULT_PROFILE = "standard"
+
+def get_image_profile(profile):
+    if isinstance(profile, ImageProfile):
+        return profile
+    try:
+        return IMAGE_PROFILES[profile or DEFAULT_PROFILE]
+    except KeyError:
+        raise ValueError(f"Unknown image profile: {profile}")
+
+def profile_name(profile):
+    # The name a profile is reported under; profiles built by hand are "custom".
+    if isinstance(profile, ImageProfile):
+        return next((name for name, p in IMAGE_PROFILES.items() if p == profile), "custom")
+    return profile or DEFAULT_PROFILE
+
+def thumbnail_pixels(size, profile):
+    return tuple(max(1, round(points * profile.dpi / 72)) for points in size)
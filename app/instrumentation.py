@@ -0,0 +1,242 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+SIDECAR_FILE = ".ionify_timings.json"
+PROFILE_FILE = ".ionify_profile.prof"
+PROFILE_ENV = "IONIFY_PROFILE"
+MEMORY_ENV = "IONIFY_TRACE_MEMORY"
+TIMINGS_ENV = "IONIFY_TIMINGS"
+
+def _peak_rss_kb_windows():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize // 1024
+
+def peak_rss_kb():
+    # Process high-water mark: cheap enough to sample on every span, unlike tracemalloc.
+    try:
+        if sys.platform == "win32":
+            return _peak_rss_kb_windows()
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+    except (ImportError, OSError, AttributeError):
+        return None
+
+_current = contextvars.ContextVar("ionify_recorder", default=None)
+# Nesting follows the context, so spans opened in worker threads that run in a copy of
+# it (see contextvars.copy_context) nest under the span that submitted them.
+_depth = contextvars.ContextVar("ionify_span_depth", default=0)
+
+def _env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("", "0", "false", "no", "off")
+
+class Recorder():
+    def __init__(self, name, memory=False):
+        self.name = name
+        self.memory = memory
+        self.spans = []
+        self._peaks = []
+        self._thread = threading.get_ident()
+        self._owns_tracemalloc = False
+        self._started = None
+        self.total_s = None
+        self.peak_kb = None
+        self.peak_rss_kb = None
+        self.sidecar = None
+        self.profiler = None
+        self.profiles = []
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        self._started = time.perf_counter()
+        return self
+
+    def stop(self):
+        self.total_s = round(time.perf_counter() - self._started, 6)
+        self.peak_rss_kb = peak_rss_kb()
+        if self.memory and tracemalloc.is_tracing():
+            self.peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        # tracemalloc's peak is process-wide, so only the recording thread attributes it.
+        if self.memory and tracemalloc.is_tracing() and threading.get_ident() == self._thread:
+            # tracemalloc keeps one global peak: fold it into the enclosing span before resetting.
+            peak = tracemalloc.get_traced_memory()[1]
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            self._peaks.append(0)
+            tracemalloc.reset_peak()
+            tracking = True
+        else:
+            tracking = False
+
+        depth = _depth.get()
+        token = _depth.set(depth + 1)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            _depth.reset(token)
+            record = {
+                "name": name,
+                "depth": depth,
+                "start_s": round(start - self._started, 6),
+                "duration_s": round(end - start, 6),
+                "peak_rss_kb": peak_rss_kb(),
+            }
+            if tracking:
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                record["peak_kb"] = round(peak / 1024, 1)
+            record.update(attrs)
+            self.spans.append(record)
+
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    def add_spans(self, spans, offset_s=0.0, depth=0):
+        # Spans recorded in another process, shifted onto this recorder's clock.
+        for s in spans:
+            s = dict(s, start_s=round(s["start_s"] + offset_s, 6), depth=s["depth"] + depth)
+            self.spans.append(s)
+
+    def add_profile(self, stats):
+        # Raw cProfile stats of a profiler that ran in another process.
+        self.profiles.append(stats)
+
+    def totals(self):
+        totals = {}
+        for s in self.spans:
+            t = totals.setdefault(s["name"], {"count": 0, "total_s": 0.0})
+            t["count"] += 1
+            t["total_s"] = round(t["total_s"] + s["duration_s"], 6)
+            for key in ("peak_kb", "peak_rss_kb"):
+                if s.get(key) is not None:
+                    t[key] = max(t.get(key, 0), s[key])
+        return totals
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "total_s": self.total_s,
+            "peak_kb": self.peak_kb,
+            "peak_rss_kb": self.peak_rss_kb,
+            "spans": sorted(self.spans, key=lambda s: s["start_s"]),
+            "totals": self.totals(),
+        }
+
+def current_recorder():
+    return _current.get()
+
+def span(name, **attrs):
+    recorder = _current.get()
+    if recorder is None:
+        return nullcontext()
+    return recorder.span(name, **attrs)
+
+def write_sidecar(data, output_dir):
+    path = os.path.join(output_dir, SIDECAR_FILE)
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    except OSError:
+        return None
+    return path
+
+class _ProfileStats():
+    # The interface pstats.Stats loads a profiler from, for stats sent from another process.
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+def profile_stats(profiler):
+    profiler.create_stats()
+    return profiler.stats
+
+def _merged_stats(profiler, profiles):
+    import pstats
+
+    stats = pstats.Stats(profiler)
+    for other in profiles:
+        stats.add(pstats.Stats(_ProfileStats(other)))
+    return stats
+
+@contextmanager
+def recording(name, output_dir=None, memory=None, profile=None, timings=None):
+    # Nothing is written to output_dir unless the timings sidecar or the profile is
+    # asked for, by argument or environment.
+    memory = _env_flag(MEMORY_ENV, False) if memory is None else memory
+    profile = _env_flag(PROFILE_ENV, False) if profile is None else profile
+    timings = _env_flag(TIMINGS_ENV, False) if timings is None else timings
+
+    recorder = Recorder(name, memory)
+    token = _current.set(recorder)
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        recorder.profiler = profiler
+
+    recorder.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield recorder
+    finally:
+        if profiler:
+            profiler.disable()
+        recorder.stop()
+        _current.reset(token)
+
+        if output_dir and (timings or profiler) and os.path.isdir(output_dir):
+            data = recorder.to_dict()
+            data["profile"] = None
+            if profiler:
+                profile_path = os.path.join(output_dir, PROFILE_FILE)
+                try:
+                    _merged_stats(profiler, recorder.profiles).dump_stats(profile_path)
+                    data["profile"] = profile_path
+                except OSError:
+                    pass
+            recorder.sidecar = write_sidecar(data, output_dir)
@@ -0,0 +1,60 @@
+import queue
+import threading
+
+EVENT_PROGRESS = "progress"
+EVENT_DONE = "done"
+EVENT_ERROR = "error"
+EVENT_CANCELLED = "cancelled"
+
+class JobCancelled(Exception):
+    pass
+
+class BackgroundJob():
+    def __init__(self, target, *args, **kwargs):
+        self._target = target
+        self._args = args
+        self._kwargs = kwargs
+        self._cancel = threading.Event()
+        self._thread = None
+        self.events = queue.Queue()
+
+    def progress(self, stage=None, done=None, total=None):
+        # Raises JobCancelled once cancel() was called; without a stage it only checks.
+        if self._cancel.is_set():
+            raise JobCancelled()
+        if stage is None:
+            return
+        self.events.put((EVENT_PROGRESS, (stage, done, total)))
+
+    def _run(self):
+        try:
+            result = self._target(*self._args, progress=self.progress, **self._kwargs)
+        except JobCancelled:
+            self.events.put((EVENT_CANCELLED, None))
+        except Exception as e:
+            self.events.put((EVENT_ERROR, e))
+        else:
+            self.events.put((EVENT_DONE, result))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def drain(self):
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
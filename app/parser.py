@@ -0,0 +1,175 @@
+import codecs
+import os
+from collections import OrderedDict
+
+from models.systemName import System
+from models.measurement_table import MeasurementTable
+
+from app.instrumentation import span
+from app.detector import detect_system, row_signature
+
+SNIFF_BYTES = 4096
+
+OE_PASSPHRASES = (
+    "isolemnlyswearthatiamuptonogood",
+    "slavnostneprisahamzejsempripravenkekazdespatnosti",
+    "slavnostneprisahamzenemamzalubomnicdobre",
+)
+
+RECORD_OE = "oe"
+RECORD_DATE = "date"
+RECORD_ROW = "row"
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Last encoding that decoded each log cleanly, keyed by path so a log that is appended
+# to keeps it. It is only trusted while it still decodes the start of the file, and the
+# least recently used entries are dropped so a long watch session does not grow it.
+ENCODING_CACHE_SIZE = 256
+_encoding_cache = OrderedDict()
+
+def _cached_encoding(path, prefix):
+    key = os.path.abspath(path)
+    encoding = _encoding_cache.get(key)
+    if encoding is None:
+        return None
+    try:
+        # The prefix may end in the middle of a multi-byte sequence.
+        codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+    except UnicodeDecodeError:
+        del _encoding_cache[key]
+        return None
+    _encoding_cache.move_to_end(key)
+    return encoding
+
+def _remember_encoding(path, encoding):
+    key = os.path.abspath(path)
+    _encoding_cache[key] = encoding
+    _encoding_cache.move_to_end(key)
+    while len(_encoding_cache) > ENCODING_CACHE_SIZE:
+        _encoding_cache.popitem(last=False)
+
+def _is_ascii_compatible(encoding):
+    try:
+        return "Date 0\n".encode(encoding) == b"Date 0\n"
+    except (LookupError, UnicodeError):
+        return False
+
+def sniff_encoding(prefix):
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    if b"\x00" in prefix:
+        return None
+    try:
+        prefix.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # The prefix may end in the middle of a multi-byte sequence.
+        if e.start < len(prefix) - 3:
+            return None
+    return "utf-8"
+
+def detect_encoding(path):
+    from charset_normalizer import from_path
+    with span("charset_detection"):
+        best = from_path(path).best()
+    return best.encoding if best is not None else "utf-8"
+
+def _fallback_decoders(path, prefix):
+    cached = _cached_encoding(path, prefix)
+    if cached and _is_ascii_compatible(cached):
+        yield cached
+    detected = detect_encoding(path)
+    if detected != cached and _is_ascii_compatible(detected):
+        yield detected
+
+def iter_lines(path, encoding=None):
+    with open(path, "rb") as f:
+        prefix = f.read(SNIFF_BYTES)
+        encoding = encoding or sniff_encoding(prefix)
+        f.seek(0)
+
+        if encoding is None or not _is_ascii_compatible(encoding):
+            # Wide or unknown encodings cannot be split on b"\n"; hand them to the text layer.
+            encoding = encoding or _cached_encoding(path, prefix) or detect_encoding(path)
+            _remember_encoding(path, encoding)
+            with open(path, "r", encoding=encoding) as text:
+                yield from text
+            return
+
+        decode = codecs.getdecoder(encoding)
+        fallbacks = None
+        for raw in f:
+            try:
+                line = decode(raw)[0]
+            except UnicodeDecodeError:
+                if fallbacks is None:
+                    fallbacks = _fallback_decoders(path, prefix)
+                line = None
+                for encoding in fallbacks:
+                    decode = codecs.getdecoder(encoding)
+                    try:
+                        line = decode(raw)[0]
+                        break
+                    except UnicodeDecodeError:
+                        continue
+                if line is None:
+                    raise
+                _remember_encoding(path, encoding)
+            yield line
+
+def iter_records(path, encoding=None):
+    for line in iter_lines(path, encoding):
+        line = line.strip()
+        if not line:
+            continue
+        if line in OE_PASSPHRASES:
+            yield RECORD_OE, line
+        elif line.startswith("Date"):
+            yield RECORD_DATE, line
+        else:
+            parts = line.split()
+            if len(parts) >= 21:
+                yield RECORD_ROW, parts
+
+def append_parts(table, parts):
+    table.append_row(
+        parts[0],
+        parts[1] + " " + parts[2],
+        parts[3],
+        [float(p) for p in parts[4:20]],
+        parts[20],
+        parts[21] if len(parts) > 21 else "",
+    )
+
+def parse_and_detect(path, encoding=None, system_hint=None):
+    system = None
+    oe = False
+    signatures = []
+
+    with span("parse"):
+        for kind, value in iter_records(path, encoding):
+            if kind == RECORD_OE:
+                oe = True
+            elif kind == RECORD_DATE:
+                system = System(value, MeasurementTable())
+            else:
+                if system is None:
+                    raise ValueError(f"{path} has no Date header before the first mode row")
+                signatures.append(row_signature(value))
+                append_parts(system.results, value)
+
+    with span("system_detection"):
+        detection = detect_system(signatures, system_hint)
+    flags = dict(detection.flags, oe=oe)
+    return system, flags, detection
+
+def parse_best_mode_file(path, encoding=None):
+    system, flags, _ = parse_and_detect(path, encoding)
+    return system, flags
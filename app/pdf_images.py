@@ -1,37 +1,70 @@
+import contextvars
+import io
 import os
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Image as RLImage, Spacer
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Frame, Table, TableStyle, Paragraph, Image as RLImage, Spacer
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import mm
+from reportlab.lib.units import mm, inch
 from reportlab.lib.styles import getSampleStyleSheet
 from PIL import Image as PILImage
 
-def export_images_to_pdf(images, output_dir):
-    pdf_path = os.path.join(output_dir, "Ion_gun_maps.pdf")
-    doc = SimpleDocTemplate(pdf_path, pagesize=A4)
+from app.instrumentation import span
+from app.bmp_decode import decode_reduced, REDUCING_GAP
+from app.systemConfig import IMAGES_PDF
+from app.image_profiles import ENCODING_JPEG, DEFAULT_PROFILE, get_image_profile, profile_name, thumbnail_pixels
 
-    styles = getSampleStyleSheet()
-    elements = []
-    data, row, temp_files = [], [], []
+# Size of each beam map on the page, in points; the profile decides how many pixels fill it.
+THUMBNAIL_SIZE = (250, 250)
+# Thumbnails decoded ahead of layout; the next batch decodes while this one is placed.
+IMAGES_PER_BATCH = 8
 
-    for i, photo in enumerate(images):
-        img = PILImage.open(photo.image_path)
-        img = img.resize((250, 250), PILImage.LANCZOS)
+def make_thumbnail(image_path, size=THUMBNAIL_SIZE, profile=DEFAULT_PROFILE):
+    profile = get_image_profile(profile)
+    pixels = thumbnail_pixels(size, profile)
+    reduced = decode_reduced(image_path, pixels)
+    if reduced is not None:
+        array, box = reduced
+        thumb = PILImage.fromarray(array, "RGB").resize(pixels, PILImage.LANCZOS, box=box)
+    else:
+        with PILImage.open(image_path) as img:
+            thumb = img.resize(pixels, PILImage.LANCZOS, reducing_gap=REDUCING_GAP)
 
-        tmp = os.path.join(output_dir, f"_tmp_image_{i}.png")
-        img.save(tmp)
-        temp_files.append(tmp)
+    buf = io.BytesIO()
+    if profile.encoding == ENCODING_JPEG:
+        # ReportLab embeds JPEG data as-is (DCTDecode) instead of re-encoding pixels.
+        thumb.convert("RGB").save(buf, format="JPEG", quality=profile.quality, optimize=True)
+    elif profile.colors:
+        thumb.convert("RGB").quantize(profile.colors).save(buf, format="PNG", compress_level=1)
+    else:
+        # Uncompressed BMP: ReportLab re-encodes the pixels itself, so a PNG pass would be wasted work.
+        thumb.save(buf, format="BMP")
+    buf.seek(0)
+    return buf
 
-        cell = [
-            RLImage(tmp),
-            Spacer(1, 2 * mm),
-            Paragraph(photo.name.removesuffix(".bmp"), styles["Normal"])
-        ]
+def _traced_thumbnail(image_path, size, profile):
+    with span("thumbnail"):
+        return make_thumbnail(image_path, size, profile)
+
+@lru_cache(maxsize=None)
+def _caption_style():
+    return getSampleStyleSheet()["Normal"]
 
-        row.append(cell)
+def _new_frame(pagesize=A4, margin=inch):
+    return Frame(margin, margin, pagesize[0] - 2 * margin, pagesize[1] - 2 * margin)
+
+def _batch_table(batch, thumbnails, caption_style):
+    data, row = [], []
+    for photo, thumb in zip(batch, thumbnails):
+        row.append([
+            RLImage(thumb, width=THUMBNAIL_SIZE[0], height=THUMBNAIL_SIZE[1]),
+            Spacer(1, 2 * mm),
+            Paragraph(photo.name.removesuffix(".bmp"), caption_style)
+        ])
         if len(row) == 2:
             data.append(row)
             row = []
-
     if row:
         row.append('')
         data.append(row)
@@ -42,11 +75,92 @@ def export_images_to_pdf(images, output_dir):
         ('LEFTPADDING', (0, 0), (-1, -1), 5),
         ('RIGHTPADDING', (0, 0), (-1, -1), 5),
     ]))
+    return table
+
+class _PageLayout():
+    # Flows tables onto the pages of one canvas, splitting them between rows. A page is
+    # only started when something is left to draw, so the document never ends blank.
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.frame = _new_frame()
+        self.page_used = False
+
+    def place(self, flowable):
+        pending = [flowable]
+        while pending:
+            flowable = pending.pop(0)
+            if self.frame.add(flowable, self.canvas, trySplit=1):
+                self.page_used = True
+                continue
+            parts = self.frame.split(flowable, self.canvas)
+            if parts and self.frame.add(parts[0], self.canvas, trySplit=1):
+                self.page_used = True
+                pending[0:0] = parts[1:]
+            elif not self.page_used:
+                raise ValueError("Image cell is larger than the page")
+            else:
+                pending.insert(0, flowable)
+            if pending:
+                self.canvas.showPage()
+                self.frame = _new_frame()
+                self.page_used = False
+
+def export_images_to_pdf(images, output_dir, workers=None, progress=None, batch_size=IMAGES_PER_BATCH,
+                         profile=DEFAULT_PROFILE, report=None):
+    # Streams the report: only the batch being placed and the one being decoded are
+    # held in memory, and each page is laid out as soon as its thumbnails are ready.
+    pdf_path = os.path.join(output_dir, IMAGES_PDF)
+    image_profile = get_image_profile(profile)
+    canvas = Canvas(pdf_path, pagesize=A4)
+    layout = _PageLayout(canvas)
+    caption_style = _caption_style()
+    batch_size += batch_size % 2
+    batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        def submit(batch):
+            # Each task runs in a copy of this context so its span reaches the current recorder.
+            return [
+                pool.submit(contextvars.copy_context().run, _traced_thumbnail, photo.image_path, THUMBNAIL_SIZE, image_profile)
+                for photo in batch
+            ]
+
+        upcoming = submit(batches[0]) if batches else []
+        placed = 0
+        image_bytes = 0
+        for n, batch in enumerate(batches):
+            with span("thumbnails", images=len(batch)):
+                thumbnails = [f.result() for f in upcoming]
+            image_bytes += sum(t.getbuffer().nbytes for t in thumbnails)
+            upcoming = submit(batches[n + 1]) if n + 1 < len(batches) else []
+
+            with span("images_layout"):
+                layout.place(_batch_table(batch, thumbnails, caption_style))
+            del thumbnails
+
+            placed += len(batch)
+            if progress:
+                progress("images", placed, len(images))
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+    if progress:
+        progress("images_pdf")
+    with span("images_build"):
+        canvas.save()
 
-    doc.build([table])
+    if report is not None:
+        report.update({
+            "profile": profile_name(profile),
+            "encoding": image_profile.encoding,
+            "dpi": image_profile.dpi,
+            "quality": image_profile.quality,
+            "colors": image_profile.colors,
+            "pixels": list(thumbnail_pixels(THUMBNAIL_SIZE, image_profile)),
+            "images": len(images),
+            "image_bytes": image_bytes,
+            "pdf_bytes": os.path.getsize(pdf_path),
+        })
 
-    for f in temp_files:
-        if os.path.exists(f):
-            os.remove(f)
-    
     return pdf_path
@@ -1,165 +1,243 @@
 import os
-from typing import List, Tuple
+from functools import lru_cache
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
 from reportlab.lib.pagesizes import landscape, A3
 from reportlab.lib import colors
-from tkinter import messagebox
-
-from app.rules import (get_rules_for, RATIO_RANGE_NEXSA, RATIO_RANGE_ESCALAB, SHIFT_RANGE, RATIO_RANGE_SPEC)
-from app.validation import (validate_row, in_range, apply_red)
-from app.functions import resource_path
-from app.systemConfig import get_system_config
-from app.watermark import draw_image_watermark
-
-def export_txt_to_pdf(system, output_dir, system_var: bool, ionGun_var: bool, isISS: bool, isOE:bool):
-    pdf_path = os.path.join(output_dir, "BestModeData_V3.pdf")
-    pdf = SimpleDocTemplate(pdf_path, pagesize=landscape(A3), topMargin=30)
-    wrong_modes: List[Tuple[str, str]] = []
-
-    param_col_index = {
-        "extractor": 7,
-        "condensor": 8,
-        "drift": 9,
-        "magnet": 10,
-        "Xshift": 12,
-        "Yshift": 13,
-        "ratio": 14,
-        "specification": 19
-    }
-
-    apply_red_local = apply_red if not isOE else (lambda *args, **kwargs: None)
-    in_range_local = in_range
-    ratio_range = RATIO_RANGE_NEXSA if system_var else RATIO_RANGE_ESCALAB
-    ratio_range_spec = RATIO_RANGE_SPEC
-    shift_range = SHIFT_RANGE
-
-    cfg = get_system_config(system_var, ionGun_var, isISS)
-    
-    if not cfg:
-        messagebox.showerror("Error", "Select correct system")
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from models.measurement_table import MeasurementTable
+
+from app.validation import compile_highlights
+from app.functions import show_error as _show_error
+from app.validation_engine import compile_rules, rules_for_flags, wrong_modes_of
+from app.systemConfig import get_config_by_system, TABLE_PDF
+from app.watermark import get_watermark
+from app.instrumentation import span
+
+FONT_SIZE = 9
+ROW_HEIGHT = 18
+HEADER_ROWS = 2
+# ReportLab's default cell padding (left + right) and frame padding (top + bottom).
+CELL_PADDING = 12
+FRAME_PADDING = 12
+TEXT_COLUMNS = (0, 1, 18, 19)
+
+HORIZONTAL_SPANS = [
+    (15, 0, 17, 0),
+    (4,  0,  5, 0),
+    (2,  0,  3, 0),
+]
+VERTICAL_SPAN_COLS = [12, 13, 14, 18, 19, 0, 1]
+
+PAGE_SIZE = landscape(A3)
+TOP_MARGIN = 30
+PARAM_COL_INDEX = {
+    "extractor": 7,
+    "condensor": 8,
+    "drift": 9,
+    "magnet": 10,
+    "Xshift": 12,
+    "Yshift": 13,
+    "ratio": 14,
+    "specification": 19
+}
+
+def export_txt_to_pdf(system, output_dir, system_var: bool, ionGun_var: bool, isISS: bool, isOE:bool, on_error=None):
+    show_error = on_error or _show_error
+
+    rules = rules_for_flags(system_var, ionGun_var, isISS, show_error)
+    if rules is None:
         return None
-    
-    max_i = cfg["rows"]
-    system_type = cfg["system"]
-
-    results_sorted = sorted(system.results, key=lambda m: int(str(m.index).strip("[]")))
-    sorted_by_idx = {int(str(m.index).strip("[]")): m for m in results_sorted}
-
-    def _build_table_data():
-        headers1 = [
-            "Date and Time", "", "Ion Energy", "", "Electron Energy", "", "Fil",
-            "Extractor", "Condenser", "Drift", "Magnet", "Focus", "X Shift", "Y Shift", "Ratio",
-            "Sample Current", "", "", "Mode Type", "Passed Specification"
-        ]
-        headers2 = [
-            "", "", "(eV)", "(μA)", "(eV)", "(mA)", "(eV)",
-            "(eV)", "(eV)", "(eV)", "(A)", "(eV)", "", "", "",
-            "(work)", "(max)", "(aim)", "", ""
-        ]
-        data = [headers1, headers2]
-
-        for i in range(max_i + 1):
-            m = sorted_by_idx.get(i)
-            if m is None:
-                data.append(_empty_row_for_index())
-            else:
-                data.append([
-                    f"{m.index} {m.date}", m.setup,
-                    m.ion_energy_eV, m.ion_energy_uA,
-                    m.electron_energy_eV, m.electron_energy_mA,
-                    m.fil, m.extractor, m.condensor,
-                    m.drift, m.magnet, m.focus,
-                    m.X_shift, m.Y_shift, m.ratio,
-                    m.sample_current_work, m.sample_current_max,
-                    m.sample_current_aim, m.mode, m.specification
-                ])
-
-        return data
-
-    def _make_table_style(font_size: int = 9) -> TableStyle:
-        style_cmds = [
-            ('BACKGROUND', (0, 0), (-1, 1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-            ('FONTNAME', (0, 0), (-1, 1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), font_size),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ]
-
-        horizontal_spans = [
-            (15, 0, 17, 0),
-            (4,  0,  5, 0),
-            (2,  0,  3, 0),
-        ]
-        for c0, r0, c1, r1 in horizontal_spans:
-            style_cmds.append(('SPAN', (c0, r0), (c1, r1)))
-            style_cmds.append(('ALIGN', (c0, r0), (c1, r1), 'CENTER'))
-
-        vertical_cols = [12, 13, 14, 18, 19, 0, 1]
-        for col in vertical_cols:
-            style_cmds.append(('SPAN', (col, 0), (col, 1)))
-            style_cmds.append(('VALIGN', (col, 0), (col, 1), 'MIDDLE'))
-            style_cmds.append(('ALIGN', (col, 0), (col, 1), 'CENTER'))
-
-        return TableStyle(style_cmds)
-
-    table_data = _build_table_data()
-   
-    table = Table(table_data)
-    style = _make_table_style()
+    system_type = rules.system_type
 
     try:
-        rules = get_rules_for(system_name=system_type, preset="default")
+        renderer = get_report_renderer(system_type)
     except Exception as e:
-        messagebox.showerror("Error", f"Failed to load rules for {system_type}: {e}")
+        show_error("Error", f"Failed to load rules for {system_type}: {e}")
         return None
 
-    row = 2
+    return renderer.render(system, output_dir, isOE, show_error)
+
+class ReportRenderer():
+    # The layout of a BestModeData report depends only on the system type and is built
+    # once here; render() only pays for the rules lookup and the rows of the run.
+    def __init__(self, system_type, font_size=FONT_SIZE):
+        cfg = get_config_by_system(system_type)
+        if cfg is None:
+            raise KeyError(f"Unknown system type: {system_type}")
+        self.system_type = system_type
+        self.max_i = cfg["rows"]
+        self.font_size = font_size
+        self.headers = _table_headers()
+        self.base_style = TableStyle(list(_static_style_commands(font_size)))
+        self.rows_per_page = _rows_per_page(_new_doc(os.devnull))
+        _header_widths(font_size)
+
+        self.watermark = get_watermark(system_type)
+        try:
+            self.watermark.warm()
+        except OSError:
+            # A missing watermark is reported by the first build, as before.
+            pass
+
+    def render(self, system, output_dir, isOE, on_error=None):
+        show_error = on_error or _show_error
+        pdf_path = os.path.join(output_dir, TABLE_PDF)
+        pdf = _new_doc(pdf_path)
+
+        results = system.results
+        if not isinstance(results, MeasurementTable):
+            results = MeasurementTable.from_measurements(results)
+        sorted_by_idx = results.by_mode_index()
+
+        with span("validation"):
+            # Looked up per report so a rule_store.invalidate() reaches a warm renderer.
+            validation = compile_rules(self.system_type, preset="default").evaluate(results)
+            highlights = [] if isOE else [(PARAM_COL_INDEX[v.param], v.mode_index) for v in validation.violations]
+            wrong_modes = wrong_modes_of(validation.violations)
+
+        with span("table_data"):
+            rows = list(_iter_table_rows(sorted_by_idx, self.max_i))
+            tables = _paginate(
+                rows, _column_widths(rows, self.font_size), self.rows_per_page, highlights, self.base_style, self.headers
+            )
+
+        try:
+            with span("table_build", rows=len(rows), pages=len(tables)):
+                pdf.build(
+                    tables,
+                    onFirstPage=self.watermark,
+                    onLaterPages=self.watermark)
+        except Exception as e:
+            show_error(
+                "Permission denied",
+                f"Cannot write to '{pdf_path}'.\n\nThe file may be open in another application. "
+                "Please close it and try again."
+            )
+            return None
+        
+        return wrong_modes
+
+@lru_cache(maxsize=None)
+def get_report_renderer(system_type):
+    return ReportRenderer(system_type)
+
+def _new_doc(pdf_path):
+    return SimpleDocTemplate(pdf_path, pagesize=PAGE_SIZE, topMargin=TOP_MARGIN)
+
+def _table_headers():
+    headers1 = [
+        "Date and Time", "", "Ion Energy", "", "Electron Energy", "", "Fil",
+        "Extractor", "Condenser", "Drift", "Magnet", "Focus", "X Shift", "Y Shift", "Ratio",
+        "Sample Current", "", "", "Mode Type", "Passed Specification"
+    ]
+    headers2 = [
+        "", "", "(eV)", "(μA)", "(eV)", "(mA)", "(eV)",
+        "(eV)", "(eV)", "(eV)", "(A)", "(eV)", "", "", "",
+        "(work)", "(max)", "(aim)", "", ""
+    ]
+    return [headers1, headers2]
+
+def _iter_table_rows(sorted_by_idx, max_i):
     for i in range(max_i + 1):
         m = sorted_by_idx.get(i)
         if m is None:
-            row += 1
-            continue
-
-        for param, rng in validate_row(m, rules):
-            col = param_col_index.get(param)
-            if col is not None:
-                apply_red_local(style, col, row)
-                wrong_modes.append([m.index, param, rng])
-        if m.specification == "OK" and not in_range_local(m.ratio, *ratio_range_spec):
-            apply_red_local(style, param_col_index["ratio"], row)
-            wrong_modes.append([m.index, "ratio", ratio_range_spec])
-        elif not in_range_local(m.ratio, *ratio_range): 
-            apply_red_local(style, param_col_index["ratio"], row)
-            wrong_modes.append([m.index, "ratio", ratio_range])
-        if not in_range_local(m.X_shift, *shift_range):
-            apply_red_local(style, param_col_index["Xshift"], row)
-            wrong_modes.append([m.index, "Xshift", shift_range])
-        if not in_range_local(m.Y_shift, *shift_range):
-            apply_red_local(style, param_col_index["Yshift"], row)
-            wrong_modes.append([m.index, "Yshift", shift_range])
-        if m.specification and str(m.specification).strip().upper() != "OK":
-            apply_red_local(style, param_col_index["specification"], row)
-            wrong_modes.append([m.index, "specification", ''])
-
-        row += 1
-
-    table.setStyle(style)
-    try:
-        watermark_path = resource_path(f"assets/{system_type}.jpg")
-        pdf.build([
-            table
-            ],
-            onFirstPage=lambda c, d: draw_image_watermark(c, d, watermark_path),
-            onLaterPages=lambda c, d: draw_image_watermark(c, d, watermark_path))
-    except Exception as e:
-        messagebox.showerror(
-            "Permission denied",
-            f"Cannot write to '{pdf_path}'.\n\nThe file may be open in another application. "
-            "Please close it and try again."
-        )
-        return None
-    
-    return wrong_modes
+            yield _empty_row_for_index()
+        else:
+            yield [
+                f"{m.index} {m.date}", m.setup,
+                m.ion_energy_eV, m.ion_energy_uA,
+                m.electron_energy_eV, m.electron_energy_mA,
+                m.fil, m.extractor, m.condensor,
+                m.drift, m.magnet, m.focus,
+                m.X_shift, m.Y_shift, m.ratio,
+                m.sample_current_work, m.sample_current_max,
+                m.sample_current_aim, m.mode, m.specification
+            ]
+
+def _build_table_data(sorted_by_idx, max_i):
+    return _table_headers() + list(_iter_table_rows(sorted_by_idx, max_i))
+
+@lru_cache(maxsize=None)
+def _header_widths(font_size):
+    headers1, headers2 = _table_headers()
+    spanned = {c0 for c0, _, _, _ in HORIZONTAL_SPANS}
+    widths = []
+    for col, (h1, h2) in enumerate(zip(headers1, headers2)):
+        top = 0 if col in spanned else stringWidth(h1, "Helvetica-Bold", font_size)
+        widths.append(max(top, stringWidth(h2, "Helvetica-Bold", font_size)) + CELL_PADDING)
+    spans = tuple(
+        (c0, c1, stringWidth(headers1[c0], "Helvetica-Bold", font_size) + CELL_PADDING)
+        for c0, _, c1, _ in HORIZONTAL_SPANS
+    )
+    return tuple(widths), spans
+
+def _column_widths(rows, font_size=FONT_SIZE):
+    # Numbers are sized by character count so only the few text columns need font metrics.
+    header_widths, spans = _header_widths(font_size)
+    widths = list(header_widths)
+    digit = stringWidth("0", "Helvetica", font_size)
+    for row in rows:
+        for col, value in enumerate(row):
+            if col in TEXT_COLUMNS:
+                w = stringWidth(str(value), "Helvetica", font_size)
+            else:
+                w = len(str(value)) * digit
+            if w + CELL_PADDING > widths[col]:
+                widths[col] = w + CELL_PADDING
+
+    for c0, c1, needed in spans:
+        current = sum(widths[c0:c1 + 1])
+        if current < needed:
+            extra = (needed - current) / (c1 - c0 + 1)
+            for col in range(c0, c1 + 1):
+                widths[col] += extra
+    return widths
+
+def _rows_per_page(doc):
+    return max(1, int((doc.height - FRAME_PADDING) // ROW_HEIGHT) - HEADER_ROWS)
+
+def _paginate(rows, col_widths, rows_per_page, highlights, base_style, headers):
+    # One small Table per page: no page splitting of a huge table, and the headers repeat.
+    # Pages without highlights share the renderer's style as is.
+    static_cmds = base_style.getCommands()
+    by_page = {}
+    for col, row in highlights:
+        page, offset = divmod(row, rows_per_page)
+        by_page.setdefault(page, []).append((col, offset + HEADER_ROWS))
+
+    tables = []
+    for page, start in enumerate(range(0, len(rows), rows_per_page)):
+        chunk = rows[start:start + rows_per_page]
+        cells = [(col, row) for col, row in by_page.get(page, ()) if row - HEADER_ROWS < len(chunk)]
+        table = Table(headers + chunk, colWidths=col_widths, rowHeights=ROW_HEIGHT, repeatRows=HEADER_ROWS)
+        table.setStyle(TableStyle(list(static_cmds) + compile_highlights(cells)) if cells else base_style)
+        tables.append(table)
+    return tables
+
+@lru_cache(maxsize=None)
+def _static_style_commands(font_size=FONT_SIZE):
+    return tuple(_make_table_style(font_size).getCommands())
+
+def _make_table_style(font_size: int = FONT_SIZE) -> TableStyle:
+    style_cmds = [
+        ('BACKGROUND', (0, 0), (-1, 1), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
+        ('FONTNAME', (0, 0), (-1, 1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), font_size),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ]
+
+    for c0, r0, c1, r1 in HORIZONTAL_SPANS:
+        style_cmds.append(('SPAN', (c0, r0), (c1, r1)))
+        style_cmds.append(('ALIGN', (c0, r0), (c1, r1), 'CENTER'))
+
+    for col in VERTICAL_SPAN_COLS:
+        style_cmds.append(('SPAN', (col, 0), (col, 1)))
+        style_cmds.append(('VALIGN', (col, 0), (col, 1), 'MIDDLE'))
+        style_cmds.append(('ALIGN', (col, 0), (col, 1), 'CENTER'))
+
+    return TableStyle(style_cmds)
 
 def _empty_row_for_index():
-    return ["", "", "", "", "", "", "", "", "", "", "", "", "", "", "", "", "", "", "", ""]
\ No newline at end of file
+    return ["", "", "", "", "", "", "", "", "", "", "", "", "", "", "", "", "", "", "", ""]
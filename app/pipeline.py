@@ -0,0 +1,329 @@
+import os
+import threading
+
+from models.image import Image
+
+from app.pdf_images import export_images_to_pdf
+from app.pdf_table import export_txt_to_pdf
+from app.data_export import export_txt_to_data
+from app.parser import parse_and_detect
+from app.jobs import JobCancelled
+from app.systemConfig import get_system_config, BEST_MODE_FILE, SYSTEM_AUTO, TABLE_PDF
+from app.instrumentation import recording, span, profile_stats
+
+STATUS_OK = "ok"
+STATUS_WRONG_MODES = "wrong_modes"
+STATUS_NO_DATA = "no_data"
+STATUS_ERROR = "error"
+
+def collect_images(folder_path):
+    return [
+        Image(f, os.path.join(folder_path, f))
+        for f in sorted(os.listdir(folder_path))
+        if f.lower().endswith(".bmp")
+    ]
+
+def process_folder(folder_path, system_var=False, images=True, table=True, progress=None, data_formats=(), parallel=None,
+                   image_profile=None, timings=None):
+    with recording(os.path.basename(os.path.normpath(folder_path)), folder_path, timings=timings) as recorder:
+        result = _process_folder(folder_path, system_var, images, table, progress, data_formats, parallel, image_profile)
+    result["timings"] = recorder.sidecar
+    return result
+
+def _process_folder(folder_path, system_var, images, table, progress, data_formats, parallel, image_profile):
+    progress = progress or (lambda *args: None)
+    result = {
+        "folder": folder_path,
+        "status": STATUS_OK,
+        "images_pdf": None,
+        "table_pdf": None,
+        "data_files": [],
+        "system": None,
+        "flags": None,
+        "wrong_modes": [],
+        "errors": [],
+    }
+
+    try:
+        if not os.path.isdir(folder_path):
+            raise FileNotFoundError(f"Folder not found: {folder_path}")
+
+        with_table = table or bool(data_formats)
+        if parallel is None:
+            parallel = (os.cpu_count() or 1) > 1
+        image_count = len(collect_images(folder_path)) if parallel and images and with_table else 0
+        if image_count:
+            parts = _run_parallel(folder_path, system_var, table, data_formats, image_profile, progress, image_count)
+        else:
+            parts = []
+            if images:
+                parts.append(_call_part(_images_part, folder_path, image_profile, progress=progress))
+            if with_table:
+                parts.append(_call_part(_table_part, folder_path, system_var, table, data_formats, progress=progress))
+
+        for part in parts:
+            _merge_part(result, part)
+
+    except JobCancelled:
+        raise
+    except Exception as e:
+        result["status"] = STATUS_ERROR
+        result["errors"].append(str(e))
+
+    return result
+
+STATUS_ORDER = (STATUS_OK, STATUS_NO_DATA, STATUS_WRONG_MODES, STATUS_ERROR)
+
+def _merge_part(result, part):
+    status = part.pop("status", STATUS_OK)
+    if STATUS_ORDER.index(status) > STATUS_ORDER.index(result["status"]):
+        result["status"] = status
+    result["errors"].extend(part.pop("errors", []))
+    result.update(part)
+
+def _call_part(fn, *args, progress):
+    try:
+        return fn(*args, progress=progress)
+    except JobCancelled:
+        raise
+    except Exception as e:
+        return {"status": STATUS_ERROR, "errors": [str(e)]}
+
+def _images_part(folder_path, image_profile, progress):
+    part = {}
+    with span("images"):
+        bmp_images = collect_images(folder_path)
+        if bmp_images:
+            part["images_report"] = {}
+            part["images_pdf"] = export_images_to_pdf(
+                bmp_images, folder_path, progress=progress, profile=image_profile, report=part["images_report"])
+    return part
+
+def _table_part(folder_path, system_var, table, data_formats, progress):
+    part = {"status": STATUS_OK, "errors": []}
+
+    def on_error(title, message):
+        # The data export and the table report the same rules problem; keep it once.
+        error = f"{title}: {message}"
+        if error not in part["errors"]:
+            part["errors"].append(error)
+
+    txt_path = os.path.join(folder_path, BEST_MODE_FILE)
+    if not os.path.isfile(txt_path):
+        part["status"] = STATUS_NO_DATA
+        return part
+
+    progress("parse")
+    system, flags, detection = parse_and_detect(txt_path, system_hint=system_var)
+    part["flags"] = flags
+    part["evidence"] = detection.evidence
+    if system is None:
+        part["status"] = STATUS_NO_DATA
+        return part
+
+    if system_var is SYSTEM_AUTO:
+        system_var = detection.key[0]
+    cfg = get_system_config(system_var, flags["ion_gun"], flags["iss"])
+    part["system"] = cfg["system"] if cfg else None
+
+    wrong_modes = []
+    if data_formats:
+        progress("data")
+        exported, part["data_files"] = export_txt_to_data(
+            system, folder_path, system_var, flags["ion_gun"], flags["iss"], flags["oe"], data_formats, on_error=on_error)
+        if exported is None:
+            # The error is recorded; the table PDF is still built.
+            part["status"] = STATUS_ERROR
+        else:
+            wrong_modes = exported
+
+    if table:
+        progress("table_pdf")
+        with span("table"):
+            wrong_modes = export_txt_to_pdf(system, folder_path, system_var, flags["ion_gun"], flags["iss"], flags["oe"], on_error=on_error)
+        if wrong_modes is None:
+            part["status"] = STATUS_ERROR
+            return part
+        part["table_pdf"] = os.path.join(folder_path, TABLE_PDF)
+
+    part["wrong_modes"] = [[str(idx), param, list(rng) if rng else rng] for idx, param, rng in wrong_modes]
+    if wrong_modes and part["status"] == STATUS_OK:
+        part["status"] = STATUS_WRONG_MODES
+    return part
+
+# The image and table builds run in two worker processes so PIL and ReportLab
+# work is not serialised by the GIL. The pool is kept warm between reports and shut
+# down when the interpreter exits.
+#
+# The GUI job and a watch rebuild can both get here from their own threads. They take
+# turns on _run_lock, so a run has the pool and the cancel flag to itself; _pool_lock
+# guards creating and shutting down the pool, which atexit can also do.
+PART_POLL_S = 0.1
+# Table stages in the order _table_part reports them; the last step is the part finishing.
+TABLE_STAGES = ("parse", "data", "table_pdf")
+TABLE_STEPS = len(TABLE_STAGES)
+_pool = None
+_pool_events = None
+_pool_cancelled = None
+_worker_events = None
+_worker_cancelled = None
+_worker_run = None
+_run_counter = 0
+_run_lock = threading.Lock()
+_pool_lock = threading.Lock()
+
+def _init_worker(events, cancelled):
+    global _worker_events, _worker_cancelled
+    _worker_events = events
+    _worker_cancelled = cancelled
+
+def _worker_progress(stage, done=None, total=None):
+    # Every progress call is also where a cancelled run stops.
+    if _worker_cancelled is not None and _worker_cancelled.value == _worker_run:
+        raise JobCancelled()
+    if _worker_events is not None and stage is not None:
+        _worker_events.put((_worker_run, stage, done, total))
+
+def _run_part_in_worker(run, name, args, profile=False):
+    global _worker_run
+    _worker_run = run
+    fn = {"images": _images_part, "table": _table_part}[name]
+    with recording(name, profile=profile) as recorder:
+        part = _call_part(fn, *args, progress=_worker_progress)
+    # The parent's profile would otherwise only show it waiting on the workers.
+    stats = profile_stats(recorder.profiler) if recorder.profiler else None
+    return part, recorder.spans, stats
+
+def _get_pool():
+    with _pool_lock:
+        return _start_pool()
+
+def _start_pool():
+    global _pool, _pool_events, _pool_cancelled
+    if _pool is None:
+        import atexit
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        if _pool_events is None:
+            atexit.register(shutdown_pool)
+        _pool_events = multiprocessing.Queue()
+        # Number of the run being cancelled; workers compare it with their own.
+        _pool_cancelled = multiprocessing.Value("q", 0, lock=False)
+        _pool = ProcessPoolExecutor(max_workers=2, initializer=_init_worker, initargs=(_pool_events, _pool_cancelled))
+    return _pool, _pool_events, _pool_cancelled
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def shutdown_pool():
+    global _pool, _pool_events, _pool_cancelled
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        if _pool_events is not None:
+            _pool_events.close()
+        _pool = _pool_events = _pool_cancelled = None
+
+class _Progress():
+    # Folds the images and table parts into one "reports" stage, so the two workers
+    # move a single bar forward instead of taking turns with it.
+    def __init__(self, images, progress):
+        self.progress = progress
+        self.images_total = images + 1
+        self.images = 0
+        self.table = 0
+
+    def update(self, stage, done=None, total=None):
+        if stage == "images" and done is not None:
+            self.images = done
+        elif stage == "images_pdf":
+            self.images = self.images_total - 1
+        elif stage in TABLE_STAGES:
+            self.table = TABLE_STAGES.index(stage)
+        self.report()
+
+    def finished(self, name):
+        if name == "images":
+            self.images = self.images_total
+        else:
+            self.table = TABLE_STEPS
+        self.report()
+
+    def report(self):
+        self.progress("reports", self.images + self.table, self.images_total + TABLE_STEPS)
+
+def _drain(events, run, on_event):
+    import queue
+
+    while True:
+        try:
+            event_run, stage, done, total = events.get_nowait()
+        except queue.Empty:
+            return
+        if event_run == run:
+            on_event(stage, done, total)
+
+def _run_parallel(folder_path, system_var, table, data_formats, image_profile, progress, images):
+    # Waiting for another run stays cancellable.
+    while not _run_lock.acquire(timeout=PART_POLL_S):
+        progress(None)
+    try:
+        return _run_parallel_locked(folder_path, system_var, table, data_formats, image_profile, progress, images)
+    finally:
+        _run_lock.release()
+
+def _run_parallel_locked(folder_path, system_var, table, data_formats, image_profile, progress, images):
+    from concurrent.futures import wait, FIRST_COMPLETED
+    from concurrent.futures.process import BrokenProcessPool
+    from app.instrumentation import current_recorder
+
+    global _run_counter
+    _run_counter += 1
+    run = _run_counter
+    pool, events, cancelled = _get_pool()
+    recorder = current_recorder()
+    offset = recorder.elapsed() if recorder else 0.0
+    profile = recorder is not None and recorder.profiler is not None
+    combined = _Progress(images, progress)
+    combined.report()
+
+    futures = {
+        pool.submit(_run_part_in_worker, run, "images", (folder_path, image_profile), profile): "images",
+        pool.submit(_run_part_in_worker, run, "table", (folder_path, system_var, table, data_formats), profile): "table",
+    }
+    parts = {}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=PART_POLL_S, return_when=FIRST_COMPLETED)
+            # A progress call without a stage only checks whether the job was cancelled.
+            progress(None)
+            _drain(events, run, combined.update)
+            for future in done:
+                name = futures[future]
+                try:
+                    part, spans, stats = future.result()
+                except BrokenProcessPool as e:
+                    _reset_pool()
+                    part, spans, stats = {"status": STATUS_ERROR, "errors": [f"{name} build crashed: {e}"]}, [], None
+                parts[name] = part
+                combined.finished(name)
+                if recorder:
+                    recorder.add_spans(spans, offset, depth=0)
+                    if stats:
+                        recorder.add_profile(stats)
+    except JobCancelled:
+        # Tell the workers, then wait for them to stop at their next checkpoint so the
+        # pool is free and no half-written report is still being produced.
+        cancelled.value = run
+        for future in pending:
+            future.cancel()
+        wait(pending)
+        raise
+
+    return [parts["images"], parts["table"]]
@@ -0,0 +1,204 @@
+import json
+import os
+import re
+import tempfile
+import zipfile
+from functools import lru_cache
+
+from app.rules import RULES, expand_groups
+from app.functions import resource_path, cache_dir, sha256_file
+
+CACHE_VERSION = 1
+CACHE_FILE = "rules_cache.json"
+
+WORKBOOK_DIR = "data/ExcelFiles"
+WORKBOOKS = {
+    "ESQ_EX06": "EX06_ESQ.xlsx",
+    "ESQ_MAGCIS": "ESQmagcis.xlsx",
+    "NEXSA_EX06": "EX06_Nexsa.xlsx",
+    "NEXSA_EX06_ISS": "EX06_ISS.xlsx",
+    "NEXSA_MAGCIS": "Nexsamagcis.xlsx",
+    "NEXSA_MAGCIS_ISS": "Nexsamagcis_iss.xlsx",
+}
+
+RULE_PARAMS = ("extractor", "drift", "magnet")
+
+# "Table 1" header names -> Measurement attribute names.
+DEFAULT_COLUMNS = {
+    "Extractor": "extractor",
+    "Condenser": "condensor",
+    "Drift": "drift",
+    "Magnet": "magnet",
+    "Focus": "focus",
+    "X Shift": "X_shift",
+    "Y Shift": "Y_shift",
+    "Ratio": "ratio",
+    "Sample Current": "sample_current_work",
+}
+
+# Optional sheet overriding the built-in RULES. Row 1 is a header; every other row is
+#   Preset | Parameter | Min | Max | Modes
+# where an empty preset means "default" and Modes lists indexes like "[00] [03] [07]".
+# A parameter given here replaces all of its built-in limits for that preset.
+LIMITS_SHEET = "Limits"
+
+_MODE_RE = re.compile(r"\[\d+\]")
+
+_invalidate_hooks = []
+
+def _cache_path():
+    return os.path.join(cache_dir(), CACHE_FILE)
+
+def _load_cache():
+    try:
+        with open(_cache_path(), "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache.get("systems", {})
+
+def _save_cache(systems):
+    # Every writer gets its own temporary file, so batch and archive workers saving at
+    # the same time cannot interleave their writes; the last complete file wins.
+    tmp = None
+    try:
+        path = _cache_path()
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(path),
+                                         prefix=CACHE_FILE, suffix=".tmp", delete=False) as f:
+            tmp = f.name
+            json.dump({"version": CACHE_VERSION, "systems": systems}, f)
+        os.replace(tmp, path)
+    except OSError:
+        if tmp is not None:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+def _read_defaults(ws):
+    rows = ws.iter_rows(values_only=True)
+    header = None
+    defaults = {param: {} for param in DEFAULT_COLUMNS.values()}
+    for row in rows:
+        if header is None:
+            if row and row[0] == "Mode":
+                header = {col: DEFAULT_COLUMNS[name] for col, name in enumerate(row) if name in DEFAULT_COLUMNS}
+            continue
+        idx = row[0]
+        if not isinstance(idx, str) or not _MODE_RE.fullmatch(idx.strip()):
+            continue
+        for col, param in header.items():
+            if col < len(row) and row[col] is not None:
+                defaults[param][idx.strip()] = row[col]
+    return {param: values for param, values in defaults.items() if values}
+
+def _read_limits(ws, path):
+    limits = {}
+    for row_number, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+        if len(row) < 5 or row[1] is None or row[4] is None:
+            continue
+        preset = str(row[0] or "default").strip()
+        param = str(row[1]).strip()
+        try:
+            rng = [float(row[2]), float(row[3])]
+        except (TypeError, ValueError):
+            raise ValueError(
+                f"{path}: {LIMITS_SHEET} row {row_number}: bad range {row[2]!r}..{row[3]!r} for {param}"
+            ) from None
+        for idx in _MODE_RE.findall(str(row[4])):
+            limits.setdefault(preset, {}).setdefault(param, {})[idx] = rng
+    return limits
+
+def compile_workbook(path):
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        wb = load_workbook(path, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError) as e:
+        raise ValueError(f"{path}: not a readable workbook ({e})") from e
+    try:
+        compiled = {"defaults": _read_defaults(wb.worksheets[0]), "limits": {}}
+        if LIMITS_SHEET in wb.sheetnames:
+            compiled["limits"] = _read_limits(wb[LIMITS_SHEET], path)
+    finally:
+        wb.close()
+    return compiled
+
+def _is_fresh(entry, path, stat):
+    if entry.get("mtime_ns") == stat.st_mtime_ns and entry.get("size") == stat.st_size:
+        return True
+    if entry.get("sha256") == sha256_file(path):
+        entry["mtime_ns"], entry["size"] = stat.st_mtime_ns, stat.st_size
+        return True
+    return False
+
+# The workbooks are stat'ed once per process: edits made while the app is running are
+# picked up only after invalidate(). A workbook that exists but cannot be read raises
+# instead of falling back to the built-in rules.
+@lru_cache(maxsize=None)
+def _compiled_workbooks():
+    cached = _load_cache()
+    systems = {}
+    dirty = False
+
+    for system_name, filename in WORKBOOKS.items():
+        path = resource_path(os.path.join(WORKBOOK_DIR, filename))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+
+        entry = cached.get(system_name)
+        if entry and entry.get("file") == filename:
+            before = (entry.get("mtime_ns"), entry.get("size"))
+            if _is_fresh(entry, path, stat):
+                systems[system_name] = entry
+                dirty = dirty or before != (entry["mtime_ns"], entry["size"])
+                continue
+
+        compiled = compile_workbook(path)
+        compiled.update(file=filename, mtime_ns=stat.st_mtime_ns, size=stat.st_size, sha256=sha256_file(path))
+        systems[system_name] = compiled
+        dirty = True
+
+    if dirty:
+        _save_cache(systems)
+    return systems
+
+@lru_cache(maxsize=None)
+def get_rules(system_name, preset="default"):
+    try:
+        preset_data = RULES[system_name][preset]
+    except KeyError:
+        preset_data = None
+
+    overrides = _compiled_workbooks().get(system_name, {}).get("limits", {}).get(preset, {})
+    if preset_data is None and not overrides:
+        raise KeyError(f"Invalid system/preset: {system_name}/{preset}")
+
+    rules = {}
+    for param in RULE_PARAMS:
+        if param in overrides:
+            rules[param] = {idx: tuple(rng) for idx, rng in overrides[param].items()}
+        else:
+            rules[param] = expand_groups((preset_data or {}).get(param, {}))
+    return rules
+
+@lru_cache(maxsize=None)
+def get_defaults(system_name):
+    return _compiled_workbooks().get(system_name, {}).get("defaults", {})
+
+def on_invalidate(fn):
+    # Caches built from get_rules()/get_defaults() register here to be dropped with them.
+    _invalidate_hooks.append(fn)
+    return fn
+
+def invalidate():
+    for fn in _invalidate_hooks:
+        fn()
+    get_rules.cache_clear()
+    get_defaults.cache_clear()
+    _compiled_workbooks.cache_clear()
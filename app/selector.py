@@ -0,0 +1,67 @@
+import math
+
+DESIGN_SIZE = (892, 501)
+
+LEFT = "left"
+RIGHT = "right"
+
+# Click regions in design coordinates; where they overlap the first one wins.
+REGIONS = (
+    (LEFT, ((0, 501), (369, 501), (468, 0), (0, 0))),
+    (RIGHT, ((369, 501), (892, 501), (892, 0), (468, 0))),
+)
+
+def _crossings(y, poly):
+    # The same edge test as functions.point_in_polygon, solved for one row.
+    xs = []
+    n = len(poly)
+    for i in range(n):
+        x1, y1 = poly[i]
+        x2, y2 = poly[(i + 1) % n]
+        if (y1 > y) != (y2 > y):
+            xs.append((y - y1) * (x2 - x1) / (y2 - y1) + x1)
+    return sorted(xs)
+
+class HitMap():
+    # The regions rasterised once for one widget size and scaling: a hit test is a
+    # single index into `mask`.
+    def __init__(self, width, height, scaling, design_size=DESIGN_SIZE, regions=REGIONS):
+        self.width = max(0, int(width))
+        self.height = max(0, int(height))
+        self.scaling = scaling
+        self.names = (None,) + tuple(name for name, _ in regions)
+        self.mask = bytearray(self.width * self.height)
+
+        design_w, design_h = design_size
+        offset_x = (self.width / scaling - design_w) / 2
+        offset_y = (self.height / scaling - design_h) / 2
+        # Pixels whose design position lies on or inside the design rectangle.
+        x_min = max(0, math.ceil(offset_x * scaling))
+        x_max = min(self.width, math.floor((offset_x + design_w) * scaling) + 1)
+        if x_min >= x_max:
+            return
+
+        for py in range(self.height):
+            vy = py / scaling - offset_y
+            if not 0 <= vy <= design_h:
+                continue
+            row = py * self.width
+            # Later regions are drawn first so earlier ones overwrite them.
+            for code in range(len(regions), 0, -1):
+                for x0, x1 in self._spans(vy, regions[code - 1][1], offset_x, scaling):
+                    x0, x1 = max(x0, x_min), min(x1, x_max)
+                    if x0 < x1:
+                        self.mask[row + x0:row + x1] = bytes((code,)) * (x1 - x0)
+
+    def _spans(self, vy, poly, offset_x, scaling):
+        # A pixel is inside when an odd number of crossings lie to its right.
+        bounds = [math.ceil((x + offset_x) * scaling) for x in _crossings(vy, poly)]
+        edges = [0] + bounds + [self.width]
+        for j in range(len(edges) - 1):
+            if (len(bounds) - j) % 2:
+                yield edges[j], edges[j + 1]
+
+    def region_at(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.names[self.mask[y * self.width + x]]
+        return None
@@ -1,3 +1,11 @@
+BEST_MODE_FILE = "BestModeData_V3.txt"
+TABLE_PDF = "BestModeData_V3.pdf"
+IMAGES_PDF = "Ion_gun_maps.pdf"
+
+# system_var for a run: True is Nexsa, False Escalab, SYSTEM_AUTO lets the detector decide.
+SYSTEM_AUTO = None
+SYSTEM_CHOICES = {"escalab": False, "nexsa": True, "auto": SYSTEM_AUTO}
+
 SYSTEM_CONFIG = {
     (True,  True,  True):  {"system": "NEXSA_MAGCIS_ISS", "rows": 37},
     (True,  True,  False): {"system": "NEXSA_MAGCIS",     "rows": 35},
@@ -9,3 +17,10 @@ SYSTEM_CONFIG = {
 
 def get_system_config(system_var, ionGun_var, isISS):
     return SYSTEM_CONFIG.get((system_var, ionGun_var, isISS))
+
+
+def get_config_by_system(system_type):
+    for cfg in SYSTEM_CONFIG.values():
+        if cfg["system"] == system_type:
+            return cfg
+    return None
@@ -8,10 +8,65 @@ def in_range(value, min_v, max_v):
     val = to_float(value)
     return val is not None and min_v <= val <= max_v
 
+RED_BACKGROUND = "#B71C1C"
+RED_TEXT = "#FFFFFF"
+
+def red_commands(col0, row0, col1, row1):
+    return [
+        ('BACKGROUND', (col0, row0), (col1, row1), RED_BACKGROUND),
+        ('TEXTCOLOR', (col0, row0), (col1, row1), RED_TEXT),
+        ('FONTNAME', (col0, row0), (col1, row1), 'Helvetica'),
+    ]
+
 def apply_red(style, col, row):
-    style.add('BACKGROUND', (col, row), (col, row), "#B71C1C")
-    style.add('TEXTCOLOR', (col, row), (col, row), "#FFFFFF")
-    style.add('FONTNAME', (col, row), (col, row), 'Helvetica')
+    for cmd in red_commands(col, row, col, row):
+        style.add(*cmd)
+
+def _bit_runs(bits):
+    runs = []
+    col = 0
+    while bits:
+        if bits & 1:
+            start = col
+            while bits & 1:
+                bits >>= 1
+                col += 1
+            runs.append((start, col - 1))
+        else:
+            bits >>= 1
+            col += 1
+    return runs
+
+def coalesce_cells(cells):
+    # Each row is a column bitmask; runs of set bits become spans, and identical
+    # spans on consecutive rows are stacked into one rectangle.
+    mask = {}
+    for col, row in cells:
+        mask[row] = mask.get(row, 0) | (1 << col)
+
+    rects = []
+    open_rects = {}
+    for row in sorted(mask):
+        still_open = {}
+        for run in _bit_runs(mask[row]):
+            r0 = open_rects.pop(run, None)
+            if r0 is None or r0[1] != row - 1:
+                if r0 is not None:
+                    open_rects[run] = r0
+                r0 = (row, row)
+            still_open[run] = (r0[0], row)
+        for (c0, c1), (r0, r1) in open_rects.items():
+            rects.append((c0, r0, c1, r1))
+        open_rects = still_open
+    for (c0, c1), (r0, r1) in open_rects.items():
+        rects.append((c0, r0, c1, r1))
+    return rects
+
+def compile_highlights(cells):
+    cmds = []
+    for col0, row0, col1, row1 in coalesce_cells(cells):
+        cmds.extend(red_commands(col0, row0, col1, row1))
+    return cmds
 
 def validate_row(m, rules):
     idx = str(m.index)
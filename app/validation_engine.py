@@ -0,0 +1,140 @@
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+from models.measurement_table import MeasurementTable, mode_index_of
+
+from app.rules import (RATIO_RANGE_NEXSA, RATIO_RANGE_ESCALAB, SHIFT_RANGE, RATIO_RANGE_SPEC)
+from app.rule_store import get_rules, on_invalidate, RULE_PARAMS
+from app.systemConfig import get_config_by_system, get_system_config
+
+# Bit order is the order in which violations are reported for a row.
+CHECKS = RULE_PARAMS + ("ratio_spec", "ratio", "Xshift", "Yshift", "specification")
+CHECK_BITS = {name: 1 << bit for bit, name in enumerate(CHECKS)}
+CHECK_PARAMS = {name: name for name in CHECKS}
+CHECK_PARAMS["ratio_spec"] = "ratio"
+
+Violation = namedtuple("Violation", "mode_index index param range")
+ValidationResult = namedtuple("ValidationResult", "mask violations")
+
+def wrong_modes_of(violations):
+    return [[v.index, v.param, v.range] for v in violations]
+
+class CompiledRules():
+    def __init__(self, system_type, rules, rows, ratio_range, ratio_range_spec, shift_range):
+        self.system_type = system_type
+        self.rows = rows
+        self.ratio_range = ratio_range
+        self.ratio_range_spec = ratio_range_spec
+        self.shift_range = shift_range
+        self.limits = {}
+
+        size = rows + 1
+        for param in RULE_PARAMS:
+            idx_map = rules.get(param)
+            if not idx_map:
+                continue
+            mins = array("d", [0.0]) * size
+            maxs = array("d", [0.0]) * size
+            keys = [None] * size
+            ranges = [None] * size
+            for key, rng in idx_map.items():
+                i = mode_index_of(key)
+                if 0 <= i < size:
+                    mins[i], maxs[i] = rng
+                    keys[i], ranges[i] = key, tuple(rng)
+            self.limits[param] = (mins, maxs, keys, ranges)
+
+    def _range_of(self, check, i):
+        if check in self.limits:
+            return self.limits[check][3][i]
+        if check == "ratio_spec":
+            return self.ratio_range_spec
+        if check == "ratio":
+            return self.ratio_range
+        if check in ("Xshift", "Yshift"):
+            return self.shift_range
+        return ''
+
+    def evaluate(self, results):
+        table = results if isinstance(results, MeasurementTable) else MeasurementTable.from_measurements(results)
+
+        size = self.rows + 1
+        positions = [None] * size
+        for pos, i in enumerate(table.mode_index):
+            if 0 <= i < size:
+                positions[i] = pos
+        modes = [i for i, pos in enumerate(positions) if pos is not None]
+        rows = [positions[i] for i in modes]
+
+        def gather(name):
+            # One column, in mode order, with a value for each mode that has a row.
+            column = table.column(name)
+            return [column[pos] for pos in rows]
+
+        # Each check is one pass over a whole column and yields the modes it fails.
+        index_col = gather("index")
+        failed = {}
+        for param, (mins, maxs, keys, _) in self.limits.items():
+            failed[param] = [
+                i for i, index, value in zip(modes, index_col, gather(param))
+                if keys[i] is not None and index == keys[i] and not mins[i] <= value <= maxs[i]
+            ]
+
+        ratio = gather("ratio")
+        specification = gather("specification")
+        spec_ok = [spec == "OK" for spec in specification]
+        spec_min, spec_max = self.ratio_range_spec
+        ratio_min, ratio_max = self.ratio_range
+        shift_min, shift_max = self.shift_range
+
+        failed["ratio_spec"] = [i for i, ok, value in zip(modes, spec_ok, ratio) if ok and not spec_min <= value <= spec_max]
+        failed["ratio"] = [i for i, ok, value in zip(modes, spec_ok, ratio) if not ok and not ratio_min <= value <= ratio_max]
+        failed["Xshift"] = [i for i, value in zip(modes, gather("X_shift")) if not shift_min <= value <= shift_max]
+        failed["Yshift"] = [i for i, value in zip(modes, gather("Y_shift")) if not shift_min <= value <= shift_max]
+        failed["specification"] = [
+            i for i, spec in zip(modes, specification) if spec and str(spec).strip().upper() != "OK"
+        ]
+
+        mask = array("H", [0]) * size
+        for check, hits in failed.items():
+            bit = CHECK_BITS[check]
+            for i in hits:
+                mask[i] |= bit
+
+        violations = [
+            Violation(i, index, CHECK_PARAMS[check], self._range_of(check, i))
+            for i, index in zip(modes, index_col) if mask[i]
+            for check in CHECKS if mask[i] & CHECK_BITS[check]
+        ]
+        return ValidationResult(mask, violations)
+
+@lru_cache(maxsize=None)
+def compile_rules(system_type, preset="default"):
+    cfg = get_config_by_system(system_type)
+    if cfg is None:
+        raise KeyError(f"Unknown system type: {system_type}")
+    ratio_range = RATIO_RANGE_NEXSA if system_type.startswith("NEXSA") else RATIO_RANGE_ESCALAB
+    return CompiledRules(
+        system_type,
+        get_rules(system_type, preset),
+        cfg["rows"],
+        ratio_range,
+        RATIO_RANGE_SPEC,
+        SHIFT_RANGE,
+    )
+
+on_invalidate(compile_rules.cache_clear)
+
+def rules_for_flags(system_var, ionGun_var, isISS, show_error):
+    # The compiled default rules of the system the flags select, or None once the
+    # reason has been passed to show_error.
+    cfg = get_system_config(system_var, ionGun_var, isISS)
+    if not cfg:
+        show_error("Error", "Select correct system")
+        return None
+    try:
+        return compile_rules(cfg["system"], preset="default")
+    except Exception as e:
+        show_error("Error", f"Failed to load rules for {cfg['system']}: {e}")
+        return None
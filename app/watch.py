@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+import time
+
+from app.functions import sha256_file
+from app.image_profiles import profile_name
+from app.pipeline import process_folder
+from app.systemConfig import BEST_MODE_FILE, IMAGES_PDF, TABLE_PDF
+
+MANIFEST_FILE = ".ionify_manifest.json"
+# Longest wait between retries of a folder whose rebuild keeps failing.
+RETRY_MAX = 60.0
+
+def scan_inputs(folder):
+    snapshot = {}
+    with os.scandir(folder) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            if entry.name.lower().endswith(".bmp") or entry.name == BEST_MODE_FILE:
+                st = entry.stat()
+                snapshot[entry.name] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+class FolderWatcher():
+    def __init__(self, folder, system_var=False, debounce=2.0, on_result=None, image_profile=None):
+        self.folder = folder
+        self.system_var = system_var
+        self.image_profile = image_profile
+        self.debounce = debounce
+        self.on_result = on_result
+        self.manifest_path = os.path.join(folder, MANIFEST_FILE)
+        self.manifest = self._load_manifest()
+        self._snapshot = None
+        self._changed_at = None
+        self._failures = 0
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        try:
+            with open(self.manifest_path, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, indent=2)
+        except OSError:
+            pass
+
+    def _hash_inputs(self, snapshot):
+        known = self.manifest.get("files", {})
+        hashes = {}
+        for name, stat in snapshot.items():
+            entry = known.get(name)
+            if entry and tuple(entry["stat"]) == stat:
+                hashes[name] = entry["sha256"]
+            else:
+                hashes[name] = sha256_file(os.path.join(self.folder, name))
+        return hashes
+
+    def stale_outputs(self, snapshot):
+        hashes = self._hash_inputs(snapshot)
+        images = {n: h for n, h in hashes.items() if n != BEST_MODE_FILE}
+        table = hashes.get(BEST_MODE_FILE)
+        outputs = self.manifest.get("outputs", {})
+
+        rebuild_images = bool(images) and (
+            outputs.get("images") != images
+            or outputs.get("images_profile", profile_name(None)) != profile_name(self.image_profile)
+            or not os.path.isfile(os.path.join(self.folder, IMAGES_PDF))
+        )
+        rebuild_table = table is not None and (
+            outputs.get("table") != [table, self.system_var]
+            or not os.path.isfile(os.path.join(self.folder, TABLE_PDF))
+        )
+        return rebuild_images, rebuild_table, hashes
+
+    def _record(self, snapshot, hashes, images, table, files=True):
+        outputs = self.manifest.setdefault("outputs", {})
+        if images:
+            outputs["images"] = {n: h for n, h in hashes.items() if n != BEST_MODE_FILE}
+            outputs["images_profile"] = profile_name(self.image_profile)
+        if table:
+            outputs["table"] = [hashes[BEST_MODE_FILE], self.system_var]
+        if files:
+            self.manifest["files"] = {n: {"stat": list(snapshot[n]), "sha256": h} for n, h in hashes.items()}
+        self._save_manifest()
+
+    def mark_current(self):
+        # Takes the reports already in the folder as built from its current inputs, so
+        # watching a folder that was just processed does not rebuild it again.
+        snapshot = scan_inputs(self.folder)
+        _, _, hashes = self.stale_outputs(snapshot)
+        self._record(
+            snapshot, hashes,
+            any(n != BEST_MODE_FILE for n in hashes) and os.path.isfile(os.path.join(self.folder, IMAGES_PDF)),
+            BEST_MODE_FILE in hashes and os.path.isfile(os.path.join(self.folder, TABLE_PDF)),
+        )
+        self._snapshot = snapshot
+        self._changed_at = None
+
+    def rebuild(self, snapshot):
+        rebuild_images, rebuild_table, hashes = self.stale_outputs(snapshot)
+        if not (rebuild_images or rebuild_table):
+            self._failures = 0
+            return None
+
+        result = process_folder(self.folder, self.system_var, images=rebuild_images, table=rebuild_table,
+                                image_profile=self.image_profile)
+        result["rebuilt"] = [name for name, flag in ((IMAGES_PDF, rebuild_images), (TABLE_PDF, rebuild_table)) if flag]
+
+        built_images = rebuild_images and result["images_pdf"] is not None
+        built_table = rebuild_table and result["table_pdf"] is not None
+        failed = (rebuild_images and not built_images) or (rebuild_table and not built_table)
+        # Only what was actually written is recorded; anything that failed stays stale.
+        if built_images or built_table:
+            self._record(snapshot, hashes, built_images, built_table, files=not failed)
+        self._failures = self._failures + 1 if failed else 0
+
+        if self.on_result:
+            self.on_result(result)
+        return result
+
+    def _delay(self):
+        if not self._failures:
+            return self.debounce
+        return min(max(self.debounce, 1.0) * 2 ** self._failures, RETRY_MAX)
+
+    def poll(self, now=None):
+        now = time.monotonic() if now is None else now
+        snapshot = scan_inputs(self.folder)
+
+        if snapshot != self._snapshot:
+            # The first scan, a burst of new files or an ongoing write: wait until the folder settles.
+            self._snapshot = snapshot
+            self._changed_at = now
+            return None
+
+        if self._changed_at is not None and now - self._changed_at >= self._delay():
+            result = self.rebuild(snapshot)
+            # A failed rebuild is retried, less often while it keeps failing.
+            self._changed_at = now if self._failures else None
+            return result
+        return None
+
+    def safe_poll(self):
+        try:
+            return self.poll()
+        except OSError:
+            # Folder temporarily unavailable (network share, USB stick); try again next tick.
+            self._snapshot = None
+            return None
+
+    def run(self, interval=1.0, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self.safe_poll()
+            stop_event.wait(interval)
+
+def watch_folders(folders, system_var=False, interval=1.0, debounce=2.0, on_result=None, stop_event=None,
+                  image_profile=None):
+    watchers = [FolderWatcher(f, system_var, debounce, on_result, image_profile) for f in folders]
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        for watcher in watchers:
+            watcher.safe_poll()
+        stop_event.wait(interval)
@@ -1,29 +1,87 @@
+import hashlib
+import io
+from functools import lru_cache
+
 from reportlab.lib.utils import ImageReader
 
+from app.functions import resource_path
+from app.instrumentation import span
+
+# The system assets are 1200 px JPEGs saved close to lossless. ReportLab embeds the
+# bytes of every document's watermark through a pure-Python ASCII85 pass, so the
+# reports get a copy at 1000 px, about 85 dpi across the A3 table page and a sixth
+# of the bytes, made once per system type.
+WATERMARK_MAX_PX = 1000
+
 def draw_image_watermark(canvas, doc, image_path, opacity=0.30):
-    canvas.saveState()
-    try:
-        canvas.setFillAlpha(opacity)
-    except AttributeError:
-        pass
-
-    img = ImageReader(image_path)
-    img_width, img_height = img.getSize()
-
-    page_w, page_h = doc.pagesize
-
-    scale = (page_w * 0.7) / img_width
-    w = img_width * scale
-    h = img_height * scale
-
-    x = (page_w - w) / 2
-    y = (page_h - h) / 2
-
-    canvas.drawImage(
-        img,
-        x, y,
-        width=w,
-        height=h,
-        mask='auto'
-    )
-    canvas.restoreState()
\ No newline at end of file
+    get_watermark_for_path(image_path, opacity)(canvas, doc)
+
+@lru_cache(maxsize=None)
+def _load_watermark(image_path, max_px=None):
+    from PIL import Image as PILImage
+
+    with PILImage.open(image_path) as img:
+        size = img.size
+        if not max_px or max(size) <= max_px:
+            with open(image_path, "rb") as f:
+                return f.read(), size
+
+        img = img.convert("RGB")
+        img.thumbnail((max_px, max_px), PILImage.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=85, optimize=True)
+        return buf.getvalue(), img.size
+
+class ImageWatermark():
+    def __init__(self, image_path, opacity=0.30, max_px=None):
+        self.image_path = image_path
+        self.opacity = opacity
+        self.max_px = max_px
+        self.form_name = "Watermark" + hashlib.md5(f"{image_path}|{max_px}".encode()).hexdigest()[:12]
+
+    def warm(self):
+        _load_watermark(self.image_path, self.max_px)
+        return self
+
+    def _define_form(self, canvas, doc):
+        data, (img_width, img_height) = _load_watermark(self.image_path, self.max_px)
+
+        page_w, page_h = doc.pagesize
+
+        scale = (page_w * 0.7) / img_width
+        w = img_width * scale
+        h = img_height * scale
+
+        x = (page_w - w) / 2
+        y = (page_h - h) / 2
+
+        canvas.beginForm(self.form_name)
+        canvas.drawImage(
+            ImageReader(io.BytesIO(data)),
+            x, y,
+            width=w,
+            height=h,
+            mask='auto'
+        )
+        canvas.endForm()
+
+    def __call__(self, canvas, doc):
+        # The form XObject is stored once per document and referenced from every page.
+        with span("watermark"):
+            if not canvas.hasForm(self.form_name):
+                self._define_form(canvas, doc)
+
+            canvas.saveState()
+            try:
+                canvas.setFillAlpha(self.opacity)
+            except AttributeError:
+                pass
+            canvas.doForm(self.form_name)
+            canvas.restoreState()
+
+@lru_cache(maxsize=None)
+def get_watermark_for_path(image_path, opacity=0.30, max_px=None):
+    return ImageWatermark(image_path, opacity, max_px)
+
+def get_watermark(system_type, opacity=0.30, max_px=WATERMARK_MAX_PX):
+    return get_watermark_for_path(resource_path(f"assets/{system_type}.jpg"), opacity, max_px)
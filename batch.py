@@ -0,0 +1,129 @@
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app.data_export import DATA_FORMATS
+from app.image_profiles import IMAGE_PROFILES, DEFAULT_PROFILE
+from app.pipeline import process_folder, STATUS_OK, STATUS_WRONG_MODES, STATUS_NO_DATA
+from app.systemConfig import SYSTEM_CHOICES
+
+EXIT_OK = 0
+EXIT_WRONG_MODES = 1
+EXIT_ERROR = 3
+EXIT_NO_INPUT = 4
+
+def expand_folders(patterns):
+    folders = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            path = os.path.normpath(path)
+            if os.path.isdir(path) and path not in seen:
+                seen.add(path)
+                folders.append(path)
+    return folders
+
+def run_batch(folders, system_var=False, workers=None, images=True, table=True, data_formats=(), image_profile=None,
+              timings=None):
+    if workers == 1 or len(folders) <= 1:
+        return [process_folder(f, system_var, images, table, data_formats=data_formats, image_profile=image_profile,
+                               timings=timings)
+                for f in folders]
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_folder, f, system_var, images, table, data_formats=data_formats, parallel=False, image_profile=image_profile, timings=timings): f for f in folders}
+        for future in as_completed(futures):
+            folder = futures[future]
+            try:
+                results[folder] = future.result()
+            except Exception as e:
+                results[folder] = {"folder": folder, "status": "error", "errors": [str(e)], "wrong_modes": []}
+    return [results[f] for f in folders]
+
+def exit_code_for(results):
+    if not results:
+        return EXIT_NO_INPUT
+    statuses = {r["status"] for r in results}
+    if statuses - {STATUS_OK, STATUS_WRONG_MODES, STATUS_NO_DATA}:
+        return EXIT_ERROR
+    if STATUS_WRONG_MODES in statuses:
+        return EXIT_WRONG_MODES
+    return EXIT_OK
+
+def _print_summary(results):
+    for r in results:
+        print(f"[{r['status']}] {r['folder']}" + (f" ({r['system']})" if r.get("system") else ""))
+        report = r.get("images_report")
+        if report:
+            print(f"    images: {report['profile']} {report['encoding']} {report['dpi']} dpi, {report['pdf_bytes'] / 1e6:.1f} MB")
+        if r.get("rebuilt"):
+            print(f"    rebuilt: {', '.join(r['rebuilt'])}")
+        for idx, param, rng in r.get("wrong_modes", []):
+            print(f"    Mode {idx}: {param} value (expected {rng})")
+        for err in r.get("errors", []):
+            print(f"    {err}")
+
+def _watch(folders, args):
+    from app.watch import watch_folders
+
+    def on_result(result):
+        if args.json:
+            print(json.dumps(result), flush=True)
+        else:
+            _print_summary([result])
+            sys.stdout.flush()
+
+    try:
+        watch_folders(folders, SYSTEM_CHOICES[args.system], args.interval, args.debounce, on_result,
+                      image_profile=args.image_profile)
+    except KeyboardInterrupt:
+        pass
+    return EXIT_OK
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Generate IonGun PDF reports without the GUI.")
+    parser.add_argument("folders", nargs="+", help="IonGun folders or glob patterns")
+    parser.add_argument("--system", choices=tuple(SYSTEM_CHOICES), default="escalab",
+                        help="Instrument type; 'auto' detects it from the log (EX06 logs without ISS default to Escalab)")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--no-images", action="store_true", help="Skip Ion_gun_maps.pdf")
+    parser.add_argument("--image-profile", choices=tuple(IMAGE_PROFILES), default=DEFAULT_PROFILE,
+                        help="Resolution and encoding of the beam maps in Ion_gun_maps.pdf")
+    parser.add_argument("--no-table", action="store_true", help="Skip BestModeData_V3.pdf")
+    parser.add_argument("--data", nargs="+", choices=DATA_FORMATS, default=[],
+                        help="Also write the parsed table and violations as data files (use with --no-table to skip the PDF)")
+    parser.add_argument("--timings", action="store_true", default=None,
+                        help="Write stage timings to .ionify_timings.json in each folder (also IONIFY_TIMINGS=1)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--watch", action="store_true", help="Keep running and rebuild reports when inputs change")
+    parser.add_argument("--interval", type=float, default=1.0, help="Watch polling interval in seconds")
+    parser.add_argument("--debounce", type=float, default=2.0, help="Quiet time before a watched folder is rebuilt")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    folders = expand_folders(args.folders)
+    if not folders:
+        print("No IonGun folders matched.", file=sys.stderr)
+        return EXIT_NO_INPUT
+
+    if args.watch:
+        return _watch(folders, args)
+
+    results = run_batch(folders, SYSTEM_CHOICES[args.system], args.workers, not args.no_images, not args.no_table,
+                        args.data, args.image_profile, args.timings)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_summary(results)
+
+    return exit_code_for(results)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import os
+import random
+from datetime import datetime, timedelta
+
+from app.rules import RULES, expand_groups
+from app.rule_store import get_defaults
+from app.systemConfig import SYSTEM_CONFIG
+
+SYSTEMS = tuple(cfg["system"] for cfg in SYSTEM_CONFIG.values())
+
+CLUSTER_SETUPS = ("75", "150", "300", "500", "1000", "2000")
+
+# Fallback nominal values when the default workbooks cannot be read.
+FALLBACK_NOMINAL = {
+    "extractor": 0.0,
+    "condensor": 1000.0,
+    "drift": 1500.0,
+    "magnet": 0.0,
+    "focus": 500.0,
+    "ratio": 0.5,
+    "sample_current_work": 1.0,
+}
+
+def mode_layout(system):
+    ex06 = "EX06" in system
+    mono = 18 if ex06 else (10 if system == "ESQ_MAGCIS" else 12)
+    iss = 6 if system == "NEXSA_EX06_ISS" else (2 if system == "NEXSA_MAGCIS_ISS" else 0)
+    mono_setups = ("Low", "Med", "High") if ex06 else ("Low", "High")
+
+    layout = []
+    for i in range(mono):
+        layout.append((mono_setups[i % len(mono_setups)], "Monatomic"))
+    iss_setups = ("Low", "Med", "High") if ex06 else ("Low", "High")
+    for i in range(iss):
+        layout.append((iss_setups[i % len(iss_setups)], "ISS"))
+    rows = next(cfg["rows"] for cfg in SYSTEM_CONFIG.values() if cfg["system"] == system)
+    while len(layout) <= rows:
+        layout.append((CLUSTER_SETUPS[(len(layout) - mono - iss) % len(CLUSTER_SETUPS)], "Cluster"))
+    return layout
+
+def _nominal(param, idx, defaults, rules):
+    rng = rules.get(param, {}).get(idx)
+    if rng:
+        return (rng[0] + rng[1]) / 2
+    value = defaults.get(param, {}).get(idx)
+    if isinstance(value, (int, float)):
+        return float(value)
+    return FALLBACK_NOMINAL.get(param, 0.0)
+
+def _fmt(value):
+    text = f"{value:.2f}".rstrip("0").rstrip(".")
+    return "0" if text in ("-0", "") else text
+
+def mode_rows(system, when, rng, fault_rate=0.0):
+    defaults = get_defaults(system)
+    preset = RULES.get(system, {}).get("default", {})
+    rules = {param: expand_groups(groups) for param, groups in preset.items()}
+    ex06 = "EX06" in system
+
+    rows = []
+    for i, (setup, mode) in enumerate(mode_layout(system)):
+        idx = f"[{i:02d}]"
+        values = {}
+        for param in ("extractor", "condensor", "drift", "magnet", "focus", "ratio", "sample_current_work"):
+            nominal = _nominal(param, idx, defaults, rules)
+            if param in rules and idx in rules[param]:
+                lo, hi = rules[param][idx]
+                value = rng.uniform(lo, hi)
+                if rng.random() < fault_rate:
+                    value = hi + (hi - lo + 1)
+            elif param == "ratio":
+                value = rng.uniform(0.5, 0.9) if rng.random() >= fault_rate else 0.1
+            else:
+                value = nominal * rng.uniform(0.98, 1.02)
+            values[param] = value
+
+        if ex06:
+            # EX06 guns have no extractor or magnet; the parser keys off the literal "0".
+            values["extractor"] = 0
+            values["magnet"] = 0
+
+        x_shift = rng.uniform(-20, 20) if rng.random() >= fault_rate else 150
+        work = values["sample_current_work"]
+        spec = "OK" if rng.random() >= fault_rate else "FAIL"
+        stamp = when + timedelta(minutes=i)
+        rows.append(" ".join([
+            idx, stamp.strftime("%d/%m/%Y"), stamp.strftime("%H:%M:%S"), setup,
+            "2000" if mode == "Cluster" else "1000", _fmt(rng.uniform(0.5, 3)),
+            "120", "10", "3",
+            _fmt(values["extractor"]), _fmt(values["condensor"]), _fmt(values["drift"]),
+            _fmt(values["magnet"]), _fmt(values["focus"]),
+            _fmt(x_shift), _fmt(rng.uniform(-20, 20)), _fmt(values["ratio"]),
+            _fmt(work), _fmt(work * 1.05), _fmt(work), mode, spec,
+        ]))
+    return rows
+
+def write_best_mode_file(path, system, runs=1, repeat=1, fault_rate=0.0, seed=0):
+    rng = random.Random(seed)
+    when = datetime(2025, 1, 6, 8, 0, 0)
+    lines = []
+    for run in range(runs):
+        run_time = when + timedelta(days=run)
+        lines.append(f"Date {run_time.strftime('%d/%m/%Y %H:%M:%S')}")
+        for _ in range(repeat):
+            lines.extend(mode_rows(system, run_time, rng, fault_rate))
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+def write_beam_map(path, size=(1024, 768), seed=0):
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = random.Random(seed)
+    w, h = size
+    noise = Image.effect_noise(size, 24).convert("RGB")
+    spot = Image.new("L", size, 0)
+    cx, cy = rng.uniform(0.3, 0.7) * w, rng.uniform(0.3, 0.7) * h
+    r = min(w, h) * rng.uniform(0.08, 0.2)
+    ImageDraw.Draw(spot).ellipse((cx - r, cy - r, cx + r, cy + r), fill=255)
+    spot = spot.filter(ImageFilter.GaussianBlur(r / 2))
+    heat = Image.merge("RGB", (spot, spot.point(lambda v: v * 0.6), Image.new("L", size, 40)))
+    Image.blend(noise, heat, 0.8).save(path, format="BMP")
+    return path
+
+def make_run_folder(folder, system, images=30, image_size=(1024, 768), runs=1, repeat=1, fault_rate=0.0, seed=0):
+    os.makedirs(folder, exist_ok=True)
+    write_best_mode_file(os.path.join(folder, "BestModeData_V3.txt"), system, runs, repeat, fault_rate, seed)
+    for i in range(images):
+        write_beam_map(os.path.join(folder, f"Map_{i:03d}.bmp"), image_size, seed + i)
+    return folder
@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from app.parser import parse_best_mode_file
+from app.pipeline import collect_images, process_folder, shutdown_pool, SYSTEM_AUTO
+from app.pdf_images import export_images_to_pdf
+from app.pdf_table import export_txt_to_pdf, _build_table_data
+from app.rules import get_rules_for
+from app.validation import validate_row
+from app.validation_engine import compile_rules
+
+from benchmarks.generators import SYSTEMS, make_run_folder, write_best_mode_file
+
+SCHEMA_VERSION = 1
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "min_s": min(samples),
+        "median_s": statistics.median(samples),
+        "mean_s": statistics.fmean(samples),
+        "repeat": repeat,
+    }
+
+def bench_system(system, workdir, repeat, rows_repeat, runs):
+    folder = os.path.join(workdir, system)
+    os.makedirs(folder, exist_ok=True)
+    txt = write_best_mode_file(os.path.join(folder, "BestModeData_V3.txt"), system, runs, rows_repeat, fault_rate=0.05)
+
+    parsed, flags = parse_best_mode_file(txt)
+    nexsa = system.startswith("NEXSA")
+    compiled = compile_rules(system)
+    rules = get_rules_for(system)
+    measurements = list(parsed.results)
+    by_idx = parsed.results.by_mode_index()
+
+    def validate_rows():
+        for m in measurements:
+            validate_row(m, rules)
+
+    results = {
+        "parse": _time(lambda: parse_best_mode_file(txt), repeat),
+        "validate_row": _time(validate_rows, repeat),
+        "validation_engine": _time(lambda: compiled.evaluate(parsed.results), repeat),
+        "build_table_data": _time(lambda: _build_table_data(by_idx, compiled.rows), repeat),
+        "export_txt_to_pdf": _time(
+            lambda: export_txt_to_pdf(parsed, folder, nexsa, flags["ion_gun"], flags["iss"], flags["oe"], on_error=_raise),
+            repeat,
+        ),
+    }
+    params = {"rows": len(measurements), "runs": runs, "rows_repeat": rows_repeat}
+    return {f"{system}.{name}": dict(r, params=params) for name, r in results.items()}
+
+def bench_images(workdir, repeat, images, image_size):
+    folder = make_run_folder(os.path.join(workdir, "images"), SYSTEMS[0], images, image_size)
+    bmp_images = collect_images(folder)
+    result = _time(lambda: export_images_to_pdf(bmp_images, folder), repeat)
+    result["params"] = {"images": images, "image_size": list(image_size)}
+    return {"export_images_to_pdf": result}
+
+def bench_pipeline(workdir, repeat, images, image_size):
+    # Whole reports, built in this process and in the two warm worker processes.
+    folder = make_run_folder(os.path.join(workdir, "pipeline"), SYSTEMS[0], images, image_size, fault_rate=0.05)
+    params = {"images": images, "image_size": list(image_size), "cpu_count": os.cpu_count()}
+    results = {}
+    try:
+        for name, parallel in (("serial", False), ("parallel", True)):
+            process_folder(folder, SYSTEM_AUTO, parallel=parallel)
+            results[f"process_folder.{name}"] = dict(
+                _time(lambda: process_folder(folder, SYSTEM_AUTO, parallel=parallel), repeat), params=params
+            )
+    finally:
+        shutdown_pool()
+    return results
+
+def _raise(title, message):
+    raise RuntimeError(f"{title}: {message}")
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:55s} {current['min_s'] * 1000:10.2f} ms  (new)")
+            continue
+        ratio = current["min_s"] / previous["min_s"] if previous["min_s"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:55s} {current['min_s'] * 1000:10.2f} ms  x{ratio:5.2f}{flag}")
+    return regressions
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Time the IONify report stages on synthetic data.")
+    parser.add_argument("--systems", nargs="+", choices=SYSTEMS, default=list(SYSTEMS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--rows-repeat", type=int, default=1, help="Copies of every mode row per run")
+    parser.add_argument("--runs", type=int, default=1, help="Date blocks appended to each BestModeData file")
+    parser.add_argument("--images", type=int, default=30)
+    parser.add_argument("--image-size", type=int, nargs=2, default=(1024, 768), metavar=("W", "H"))
+    parser.add_argument("--skip-images", action="store_true")
+    parser.add_argument("--skip-pipeline", action="store_true", help="Skip the serial vs parallel process_folder runs")
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a JSON file written by --out")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown before flagging (0.10 = 10%%)")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="ionify_bench_") as workdir:
+        for system in args.systems:
+            results.update(bench_system(system, workdir, args.repeat, args.rows_repeat, args.runs))
+        if not args.skip_images:
+            results.update(bench_images(workdir, max(1, args.repeat // 2), args.images, tuple(args.image_size)))
+        if not args.skip_pipeline:
+            results.update(bench_pipeline(workdir, max(1, args.repeat // 2), args.images, tuple(args.image_size)))
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+    else:
+        for name, r in sorted(results.items()):
+            print(f"{name:55s} {r['min_s'] * 1000:10.2f} ms")
+
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,45 @@
+import time
+
+STARTED_AT = time.perf_counter()
+
+if __name__ == "__main__":
+    # Report builds run in worker processes; a frozen build must hand them off before the GUI imports.
+    import multiprocessing
+    multiprocessing.freeze_support()
+
+import json
+import sys
+
 from app.gui import App
 import customtkinter as ctk
 
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("dark-blue")
 
+STARTUP_TIME_FLAG = "--startup-time"
+
+def report_startup_time(app, target):
+    # Called once the window is mapped and the event loop is idle: time until the UI is usable.
+    app.update_idletasks()
+    record = {"startup_s": round(time.perf_counter() - STARTED_AT, 4), "frozen": getattr(sys, "frozen", False)}
+    if target:
+        with open(target, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    else:
+        print(json.dumps(record), flush=True)
+    app.destroy()
+
+def _startup_time_target(argv):
+    for i, arg in enumerate(argv):
+        if arg == STARTUP_TIME_FLAG:
+            return True, argv[i + 1] if i + 1 < len(argv) else None
+        if arg.startswith(STARTUP_TIME_FLAG + "="):
+            return True, arg.split("=", 1)[1]
+    return False, None
+
 if __name__ == "__main__":
     app = App()
+    measure, target = _startup_time_target(sys.argv[1:])
+    if measure:
+        app.after_idle(lambda: app.after(0, report_startup_time, app, target))
     app.mainloop()
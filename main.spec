@@ -7,6 +7,8 @@ from PyInstaller.utils.hooks import collect_data_files
 datas = []
 if os.path.isdir("assets"):
     datas.append(("assets", "assets"))
+if os.path.isdir("data/ExcelFiles"):
+    datas.append(("data/ExcelFiles", "data/ExcelFiles"))
 
 a = Analysis(
     ['main.py'],
@@ -0,0 +1,87 @@
+from array import array
+
+from models.measurement import Measurement
+
+NUMERIC_COLUMNS = (
+    "ion_energy_eV", "ion_energy_uA", "electron_energy_eV", "electron_energy_mA", "fil",
+    "extractor", "condensor", "drift", "magnet", "focus", "X_shift", "Y_shift", "ratio",
+    "sample_current_work", "sample_current_max", "sample_current_aim",
+)
+TEXT_COLUMNS = ("index", "date", "setup", "mode", "specification")
+
+def mode_index_of(index):
+    return int(str(index).strip("[]"))
+
+class MeasurementRow():
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    @property
+    def mode_index(self):
+        return self._table.mode_index[self._row]
+
+    def __str__(self):
+        return Measurement.__str__(self)
+
+def _column_property(name):
+    return property(lambda self: self._table._columns[name][self._row])
+
+for _name in NUMERIC_COLUMNS + TEXT_COLUMNS:
+    setattr(MeasurementRow, _name, _column_property(_name))
+
+class MeasurementTable():
+    def __init__(self):
+        self._columns = {name: array("d") for name in NUMERIC_COLUMNS}
+        self._columns.update({name: [] for name in TEXT_COLUMNS})
+        self.mode_index = array("i")
+
+    @classmethod
+    def from_measurements(cls, measurements):
+        table = cls()
+        for m in measurements:
+            table.append(m)
+        return table
+
+    def append_row(self, index, date, setup, values, mode, specification=""):
+        mode_index = mode_index_of(index)
+        columns = self._columns
+        for name, value in zip(NUMERIC_COLUMNS, values):
+            columns[name].append(value)
+        columns["index"].append(index)
+        columns["date"].append(date)
+        columns["setup"].append(setup)
+        columns["mode"].append(mode)
+        columns["specification"].append(specification)
+        self.mode_index.append(mode_index)
+
+    def append(self, m):
+        self.append_row(
+            str(m.index), m.date, m.setup,
+            [getattr(m, name) for name in NUMERIC_COLUMNS],
+            m.mode, m.specification,
+        )
+
+    def column(self, name):
+        if name == "mode_index":
+            return memoryview(self.mode_index).toreadonly()
+        col = self._columns[name]
+        return memoryview(col).toreadonly() if isinstance(col, array) else tuple(col)
+
+    def by_mode_index(self):
+        return {idx: MeasurementRow(self, row) for row, idx in enumerate(self.mode_index)}
+
+    def __len__(self):
+        return len(self.mode_index)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("MeasurementTable row out of range")
+        return MeasurementRow(self, row)
+
+    def __iter__(self):
+        return (MeasurementRow(self, row) for row in range(len(self)))
@@ -0,0 +1,83 @@
+import os
+import sqlite3
+
+import pytest
+
+from app import archive
+from app.archive import Archive, instrument_of, parse_run
+from app.functions import iso_date
+from app.parser import OE_PASSPHRASES
+
+from benchmarks.generators import write_best_mode_file
+
+@pytest.mark.parametrize("text, expected", [
+    ("Date 03/02/2025 14:05:00", "2025-02-03 14:05:00"),
+    ("Date: 03/02/2025 14:05:00", "2025-02-03 14:05:00"),
+    ("03/02/2025 14:05:00", "2025-02-03 14:05:00"),
+    ("03.02.2025 14:05:00", "2025-02-03 14:05:00"),
+    ("2025-02-03 14:05:00", "2025-02-03 14:05:00"),
+    ("03/02/2025 14:05", "2025-02-03 14:05:00"),
+    ("  03/02/2025  ", "2025-02-03 00:00:00"),
+    ("02/30/2025 14:05:00", None),
+    ("Date", None),
+    ("", None),
+    (None, None),
+])
+def test_iso_date(text, expected):
+    assert iso_date(text) == expected
+
+@pytest.mark.parametrize("path, expected", [
+    (os.path.join("logs", "NX-0042", "2025-02-03", "BestModeData_V3.txt"), "NX-0042"),
+    (os.path.join("NX-0042", "run", "BestModeData_V3.txt"), "NX-0042"),
+    (os.path.join(os.sep, "run", "BestModeData_V3.txt"), "run"),
+])
+def test_instrument_of(path, expected):
+    assert instrument_of(path) == expected
+
+def _oe_log(tmp_path):
+    run_dir = tmp_path / "NX-0042" / "run1"
+    run_dir.mkdir(parents=True)
+    path = write_best_mode_file(str(run_dir / "BestModeData_V3.txt"), "NEXSA_MAGCIS", 1, 1, 0.5, 3)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(next(iter(OE_PASSPHRASES)) + "\n")
+    return path
+
+def test_oe_runs_keep_violations(tmp_path):
+    path = _oe_log(tmp_path)
+    run = parse_run(path, system_hint=True)
+    assert run["oe"] is True
+    assert run["violations"]
+
+    with Archive(str(tmp_path / "archive.sqlite3")) as db:
+        assert db.ingest([path], workers=1) == 1
+        assert db.conn.execute("SELECT oe FROM runs").fetchall() == [(1,)]
+        assert len(db.violations()) == len(run["violations"])
+        assert db.violations(oe=False) == []
+
+def test_ingest_hashes_each_file_once(tmp_path, monkeypatch):
+    path = _oe_log(tmp_path)
+    calls = []
+    real = archive.sha256_file
+    monkeypatch.setattr(archive, "sha256_file", lambda p: calls.append(p) or real(p))
+
+    with Archive(str(tmp_path / "archive.sqlite3")) as db:
+        assert db.ingest([path], workers=1) == 1
+        assert len(calls) == 1
+        assert db.ingest([path], workers=1) == 0
+        assert len(calls) == 2
+
+def test_version_1_archive_is_migrated(tmp_path):
+    db_path = str(tmp_path / "archive.sqlite3")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(archive.SCHEMA.replace("    oe INTEGER NOT NULL DEFAULT 0,\n", ""))
+    conn.execute(
+        "INSERT INTO runs (instrument, source_path, source_sha256, ingested_at) VALUES ('NX', '/x', 'abc', 'now')"
+    )
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    with Archive(db_path) as db:
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == archive.SCHEMA_VERSION
+        # Runs ingested before the OE flag existed are parsed again on the next ingest.
+        assert db.conn.execute("SELECT oe, source_sha256 FROM runs").fetchall() == [(0, "")]
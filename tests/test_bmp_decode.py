@@ -0,0 +1,74 @@
+import pytest
+from PIL import Image as PILImage
+
+from app import bmp_decode
+from app.bmp_decode import decode_reduced, reduce_factors
+from app.pdf_images import make_thumbnail
+
+from benchmarks.generators import write_beam_map
+
+np = pytest.importorskip("numpy")
+
+@pytest.fixture
+def mapped(monkeypatch):
+    # The test maps are small; take the mapped path for them anyway.
+    monkeypatch.setattr(bmp_decode, "MAPPED_MIN_PIXELS", 0)
+
+def test_reduce_factors_leave_the_gap():
+    assert reduce_factors(6000, 4000, (250, 250)) == (12, 8)
+    assert reduce_factors(1024, 768, (250, 250)) == (2, 1)
+    assert reduce_factors(320, 240, (500, 500)) == (1, 1)
+
+@pytest.mark.parametrize("size", [(1024, 768), (1023, 767)])
+def test_blocks_match_pil_reduce(tmp_path, mapped, size):
+    path = str(tmp_path / "map.bmp")
+    write_beam_map(path, size)
+    array, box = decode_reduced(path, (167, 167))
+
+    factors = reduce_factors(*size, (167, 167))
+    with PILImage.open(path) as img:
+        expected = np.asarray(img.convert("RGB").reduce(factors), int)
+    assert array.shape == expected.shape
+    # The short blocks at the right and bottom edges are averaged over what they hold.
+    assert np.abs(array.astype(int) - expected).max() <= 1
+    assert box == (0, 0, size[0] / factors[0], size[1] / factors[1])
+
+def test_top_down_rows_come_out_upright(tmp_path, mapped):
+    path = str(tmp_path / "map.bmp")
+    write_beam_map(path, (640, 480))
+    with open(path, "rb") as f:
+        offset, width, height, bpp = bmp_decode.read_header(f)
+        f.seek(0)
+        data = bytearray(f.read())
+    stride = (width * bpp + 31) // 32 * 4
+    rows = [data[offset + i * stride:offset + (i + 1) * stride] for i in range(height)]
+    data[offset:] = b"".join(reversed(rows)) + data[offset + height * stride:]
+    data[22:26] = (-height).to_bytes(4, "little", signed=True)
+    flipped = str(tmp_path / "top_down.bmp")
+    with open(flipped, "wb") as f:
+        f.write(data)
+
+    assert np.array_equal(decode_reduced(flipped, (100, 100))[0], decode_reduced(path, (100, 100))[0])
+
+def test_small_scans_go_through_pil(tmp_path):
+    path = str(tmp_path / "map.bmp")
+    write_beam_map(path, (1024, 768))
+    assert decode_reduced(path, (250, 250)) is None
+
+def test_paletted_scans_go_through_pil(tmp_path, mapped):
+    path = str(tmp_path / "map.bmp")
+    write_beam_map(path, (1024, 768))
+    paletted = str(tmp_path / "paletted.bmp")
+    with PILImage.open(path) as img:
+        img.convert("P").save(paletted)
+    assert decode_reduced(paletted, (250, 250)) is None
+    with PILImage.open(make_thumbnail(paletted)) as thumb:
+        assert thumb.size == (250, 250)
+
+def test_thumbnail_stays_close_to_a_full_lanczos_resize(tmp_path, mapped):
+    path = str(tmp_path / "map.bmp")
+    write_beam_map(path, (2000, 1500))
+    with PILImage.open(make_thumbnail(path)) as thumb, PILImage.open(path) as img:
+        full = img.resize(thumb.size, PILImage.LANCZOS)
+        diff = np.abs(np.asarray(thumb, int) - np.asarray(full, int))
+    assert diff.mean() < 1 and diff.max() <= 4
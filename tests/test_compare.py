@@ -0,0 +1,92 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.compare import compare_runs, load_run, load_runs, COMPARE_PARAMS
+from app.parser import parse_best_mode_file
+from app.systemConfig import BEST_MODE_FILE
+
+from benchmarks.generators import write_best_mode_file
+
+SYSTEM = "ESQ_EX06"
+SIZE = 18
+NAN = float("nan")
+
+def make_run(folder, run_date, **values):
+    # values: param -> {mode: value}; every other cell is missing.
+    columns = {param: np.full(SIZE, NAN) for param in COMPARE_PARAMS}
+    for param, by_mode in values.items():
+        for mode, value in by_mode.items():
+            columns[param][mode] = value
+    return {"folder": folder, "system_type": SYSTEM, "run_date": run_date, "columns": columns}
+
+@pytest.fixture
+def runs():
+    # drift [00] is 10, missing, 14, 13 over four runs; focus [02] is 100 then 50;
+    # drift [01] is only measured once.
+    return [
+        make_run("r0", "2025-01-01", drift={0: 10.0, 1: 5.0}, focus={2: 100.0}),
+        make_run("r1", "2025-01-02", focus={2: 50.0}),
+        make_run("r2", "2025-01-03", drift={0: 14.0}),
+        make_run("r3", "2025-01-04", drift={0: 13.0}),
+    ]
+
+def _stat(comparison, mode, param):
+    matches = [s for s in comparison["stats"] if s["mode"] == mode and s["param"] == param]
+    assert len(matches) == 1
+    return matches[0]
+
+def test_statistics_use_only_the_runs_that_measured_a_mode(runs):
+    comparison = compare_runs(runs)
+    drift = _stat(comparison, "[00]", "drift")
+
+    assert drift["first"] == 10.0
+    assert drift["previous"] == 14.0
+    assert drift["last"] == 13.0
+    assert drift["delta"] == -1.0
+    assert drift["delta_total"] == 3.0
+    assert drift["mean"] == pytest.approx(37 / 3)
+    # Sample deviation of 10, 14, 13.
+    assert drift["stdev"] == pytest.approx((26 / 3 / 2) ** 0.5)
+    # Least squares over the run positions 0, 2 and 3: Sxy = 16/3, Sxx = 14/3.
+    assert drift["slope_per_run"] == pytest.approx(8 / 7)
+    # ESQ_EX06 drift [00] is limited to 950..1950.
+    assert drift["scaled_by"] == "rule window"
+    assert drift["score"] == pytest.approx(3 / 1000)
+
+def test_modes_without_a_rule_are_scaled_by_value(runs):
+    focus = _stat(compare_runs(runs), "[02]", "focus")
+    assert (focus["first"], focus["previous"], focus["last"]) == (100.0, 100.0, 50.0)
+    assert focus["delta"] == -50.0
+    assert focus["stdev"] == pytest.approx(50 / 2 ** 0.5)
+    assert focus["slope_per_run"] == pytest.approx(-50.0)
+    assert focus["scaled_by"] == "value"
+    assert focus["score"] == pytest.approx(0.5)
+
+def test_single_measurements_are_left_out_and_stats_are_ranked(runs):
+    comparison = compare_runs(runs)
+    assert [(s["mode"], s["param"]) for s in comparison["stats"]] == [("[02]", "focus"), ("[00]", "drift")]
+    assert [r["folder"] for r in comparison["runs"]] == ["r0", "r1", "r2", "r3"]
+
+def test_rejects_too_few_or_mixed_runs(runs):
+    with pytest.raises(ValueError, match="at least two"):
+        compare_runs(runs[:1])
+    runs[1]["system_type"] = "NEXSA_EX06"
+    with pytest.raises(ValueError, match="different systems"):
+        compare_runs(runs)
+
+def test_load_run_places_values_by_mode(tmp_path):
+    folder = tmp_path / "run"
+    folder.mkdir()
+    write_best_mode_file(str(folder / BEST_MODE_FILE), SYSTEM, 1, 1, 0.0, 3)
+    system, _ = parse_best_mode_file(str(folder / BEST_MODE_FILE))
+
+    run = load_run(str(folder), system_hint=False)
+    assert run["system_type"] == SYSTEM
+    for m in system.results:
+        assert run["columns"]["drift"][m.mode_index] == m.drift
+
+def test_load_runs_sorts_by_date_with_undated_last(tmp_path, monkeypatch):
+    dated = {"a": "2025-02-01", "b": None, "c": "2025-01-01"}
+    monkeypatch.setattr("app.compare.load_run", lambda folder, hint: {"folder": folder, "run_date": dated[folder]})
+    assert [r["folder"] for r in load_runs(["a", "b", "c"], workers=1)] == ["c", "a", "b"]
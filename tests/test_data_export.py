@@ -0,0 +1,109 @@
+import csv
+import json
+import os
+import sys
+
+import pytest
+
+from models.measurement_table import MeasurementTable, NUMERIC_COLUMNS, TEXT_COLUMNS
+from models.systemName import System
+
+from app import pipeline
+from app.data_export import export_txt_to_data, ROW_COLUMNS, VIOLATION_COLUMNS, BASE_NAME
+from app.systemConfig import BEST_MODE_FILE, TABLE_PDF
+
+from benchmarks.generators import write_best_mode_file
+
+def _values(drift=1370.57, ratio=0.62):
+    return [1000, 1.2, 120, 10, 3, 0, 1010.32, drift, 0, 498.1, 16.32, 10.23, ratio, 1, 1.05, 1]
+
+@pytest.fixture
+def system():
+    table = MeasurementTable()
+    table.append_row("[00]", "06/01/2025 08:00:00", "Low", _values(), "Monatomic", "OK")
+    # No specification and a ratio outside 0.4..1.0.
+    table.append_row("[01]", "06/01/2025 08:01:00", "Med", _values(ratio=5.0), "Monatomic", "")
+    # A failed specification has no range.
+    table.append_row("[02]", "06/01/2025 08:02:00", "High", _values(), "Monatomic", "NO")
+    return System("Date 06/01/2025 08:00:00", table)
+
+def export(system, tmp_path, formats, isOE=False):
+    errors = []
+    wrong_modes, written = export_txt_to_data(
+        system, str(tmp_path), False, False, False, isOE, formats, on_error=lambda *e: errors.append(e))
+    return wrong_modes, written, errors
+
+def _read_csv(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))
+
+def test_csv_columns_and_empty_cells(system, tmp_path):
+    wrong_modes, written, errors = export(system, tmp_path, ("csv",))
+    assert errors == []
+    assert [os.path.basename(p) for p in written] == [f"{BASE_NAME}.csv", f"{BASE_NAME}_violations.csv"]
+
+    rows = _read_csv(written[0])
+    assert tuple(rows[0]) == ROW_COLUMNS == ("mode_index",) + TEXT_COLUMNS + NUMERIC_COLUMNS
+    assert [r[0] for r in rows[1:]] == ["0", "1", "2"]
+    assert rows[2][ROW_COLUMNS.index("specification")] == ""
+    assert float(rows[2][ROW_COLUMNS.index("ratio")]) == 5.0
+
+    violations = _read_csv(written[1])
+    assert tuple(violations[0]) == VIOLATION_COLUMNS
+    assert violations[1:] == [["1", "[01]", "ratio", "0.4", "1.0"], ["2", "[02]", "specification", "", ""]]
+    assert [param for _, param, _ in wrong_modes] == ["ratio", "specification"]
+
+def test_json_keeps_violations_of_oe_runs(system, tmp_path):
+    _, written, _ = export(system, tmp_path, ("json",), isOE=True)
+    with open(written[0], encoding="utf-8") as f:
+        data = json.load(f)
+
+    assert data["system"] == "ESQ_EX06"
+    assert data["oe"] is True
+    assert data["row_count"] == 3
+    assert data["columns"] == list(ROW_COLUMNS)
+    assert [row[0] for row in data["rows"]] == [0, 1, 2]
+    assert data["violations"] == [
+        {"mode_index": 1, "index": "[01]", "param": "ratio", "min": 0.4, "max": 1.0},
+        {"mode_index": 2, "index": "[02]", "param": "specification", "min": None, "max": None},
+    ]
+
+def test_unknown_format_is_reported(system, tmp_path):
+    wrong_modes, written, errors = export(system, tmp_path, ("csv", "xlsx"))
+    assert wrong_modes is None and written == []
+    assert errors == [("Error", "Unknown export format: xlsx")]
+
+def test_parquet_without_pyarrow_keeps_the_other_files(system, tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    wrong_modes, written, errors = export(system, tmp_path, ("csv", "parquet"))
+    assert wrong_modes is None
+    assert [os.path.basename(p) for p in written] == [f"{BASE_NAME}.csv", f"{BASE_NAME}_violations.csv"]
+    assert errors == [("Export failed", "Parquet export needs pyarrow (pip install pyarrow)")]
+
+def test_parquet_is_typed_even_without_violations(system, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    system.results = MeasurementTable()
+    system.results.append_row("[00]", "06/01/2025 08:00:00", "Low", _values(), "Monatomic", "OK")
+    _, written, errors = export(system, tmp_path, ("parquet",), isOE=True)
+    assert errors == []
+
+    rows = pq.read_table(written[0])
+    assert rows.column_names == list(ROW_COLUMNS)
+    assert rows.schema.metadata[b"oe"] == b"True"
+    violations = pq.read_table(written[1])
+    assert violations.num_rows == 0
+    assert [str(t) for t in violations.schema.types] == ["int32", "string", "string", "double", "double"]
+
+def test_failed_data_export_still_builds_the_table(tmp_path, monkeypatch):
+    write_best_mode_file(str(tmp_path / BEST_MODE_FILE), "ESQ_EX06", 1, 1, 0.0, 0)
+
+    def failing_export(*args, on_error, **kwargs):
+        on_error("Export failed", "disk full")
+        return None, []
+
+    monkeypatch.setattr(pipeline, "export_txt_to_data", failing_export)
+    part = pipeline._table_part(str(tmp_path), False, True, ("csv",), progress=lambda *a: None)
+    assert part["status"] == pipeline.STATUS_ERROR
+    assert part["errors"] == ["Export failed: disk full"]
+    assert part["table_pdf"] == os.path.join(str(tmp_path), TABLE_PDF)
+    assert os.path.isfile(part["table_pdf"])
@@ -0,0 +1,100 @@
+import pytest
+
+from app.detector import ESCALAB_MAX_INDEX, detect_system, detect_file, row_signature
+from app.parser import iter_records, RECORD_ROW
+from app.systemConfig import SYSTEM_CONFIG
+
+from benchmarks.generators import SYSTEMS, write_best_mode_file
+
+ISS_CLUSTER_ROWS = (
+    (("[14]", "[20]", "[26]", "[32]"), "75"),
+    (("[15]", "[21]", "[27]", "[33]"), "150"),
+    (("[16]", "[22]", "[28]", "[34]"), "300"),
+    (("[17]", "[23]", "[29]", "[35]"), "500"),
+    (("[18]", "[24]", "[30]", "[36]"), "1000"),
+    (("[19]", "[25]", "[31]", "[37]"), "2000"),
+)
+
+def legacy_flags(rows):
+    # The if/elif chain the GUI ran on every row before the detector existed.
+    ion_gun = iss = False
+    for parts in rows:
+        for indexes, setup in ISS_CLUSTER_ROWS:
+            if parts[0] in indexes and parts[3] == setup:
+                iss = ion_gun = True
+                break
+        if parts[9] != "0" and parts[12] != "-0":
+            ion_gun = True
+        if parts[3] == "Med":
+            ion_gun = False
+        if parts[20] == "ISS":
+            iss = True
+        if parts[20] == "Cluster":
+            ion_gun = True
+    return {"ion_gun": ion_gun, "iss": iss}
+
+def row(index, setup="Low", mode="Monatomic", extractor="0", magnet="-0"):
+    parts = [index, "01/01/2024", "10:00:00", setup] + ["1"] * 17
+    parts[9], parts[12], parts[20] = extractor, magnet, mode
+    return parts
+
+def _detect(rows, system_hint=None):
+    return detect_system([row_signature(p) for p in rows], system_hint)
+
+PRECEDENCE_CASES = [
+    ("nothing in use", [row("[01]")], False, False),
+    ("extractor and magnet", [row("[01]", extractor="5", magnet="2")], True, False),
+    ("magnet reads -0", [row("[01]", extractor="5")], False, False),
+    ("Med beats extractor", [row("[01]", "Med", extractor="5", magnet="2")], False, False),
+    ("Cluster beats Med", [row("[01]", "Med", "Cluster")], True, False),
+    ("ISS cluster setup", [row("[20]", "75", "Cluster")], True, True),
+    ("ISS cluster setup without Cluster mode", [row("[37]", "2000")], True, True),
+    ("cluster setup at a non-ISS index", [row("[13]", "75")], False, False),
+    ("ISS mode alone", [row("[05]", mode="ISS")], False, True),
+    ("later Med row wins", [row("[20]", "75", "Cluster"), row("[21]", "Med")], False, True),
+    ("later extractor row wins", [row("[01]", "Med"), row("[02]", extractor="5", magnet="2")], True, False),
+    ("silent rows keep the earlier result", [row("[01]", mode="Cluster"), row("[02]")], True, False),
+    ("ISS seen early still counts", [row("[05]", mode="ISS"), row("[06]", "Med")], False, True),
+]
+
+@pytest.mark.parametrize("rows, ion_gun, iss", [c[1:] for c in PRECEDENCE_CASES], ids=[c[0] for c in PRECEDENCE_CASES])
+def test_row_precedence_matches_legacy(rows, ion_gun, iss):
+    expected = {"ion_gun": ion_gun, "iss": iss}
+    assert legacy_flags(rows) == expected
+    assert _detect(rows).flags == expected
+
+def _generated_rows(path):
+    return [parts for kind, parts in iter_records(path) if kind == RECORD_ROW]
+
+@pytest.mark.parametrize("system_type", SYSTEMS)
+@pytest.mark.parametrize("seed", range(3))
+def test_generated_logs_match_legacy(tmp_path, system_type, seed):
+    path = write_best_mode_file(str(tmp_path / "BestModeData_V3.txt"), system_type, 2, 1, 0.2, seed)
+    nexsa = system_type.startswith("NEXSA")
+
+    assert _detect(_generated_rows(path)).flags == legacy_flags(_generated_rows(path))
+    # With the instrument the user would have picked, the detected system is the generated one.
+    assert detect_file(path, system_hint=nexsa).system == system_type
+
+@pytest.mark.parametrize("system_type", SYSTEMS)
+def test_nexsa_inferred_without_hint(tmp_path, system_type):
+    path = write_best_mode_file(str(tmp_path / "BestModeData_V3.txt"), system_type, 1, 1, 0.0, 0)
+    rows = _generated_rows(path)
+    max_index = max(int(p[0].strip("[]")) for p in rows)
+    detection = _detect(rows, system_hint=False)
+
+    # ISS modes or a mode index past the Escalab range overrule an Escalab selection.
+    nexsa = detection.flags["iss"] or max_index > ESCALAB_MAX_INDEX
+    assert detection.key[0] == nexsa
+    if nexsa:
+        assert detection.system == system_type
+
+def test_escalab_max_index_boundary():
+    assert ESCALAB_MAX_INDEX == max(cfg["rows"] for key, cfg in SYSTEM_CONFIG.items() if not key[0])
+    at_limit = [row(f"[{ESCALAB_MAX_INDEX}]", extractor="5", magnet="2")]
+    past_limit = [row(f"[{ESCALAB_MAX_INDEX + 1}]", extractor="5", magnet="2")]
+
+    assert _detect(at_limit, system_hint=False).system == "ESQ_MAGCIS"
+    assert _detect(at_limit, system_hint=True).system == "NEXSA_MAGCIS"
+    assert _detect(past_limit, system_hint=False).system == "NEXSA_MAGCIS"
+    assert _detect(past_limit).system == "NEXSA_MAGCIS"
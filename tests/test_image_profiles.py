@@ -0,0 +1,76 @@
+import os
+
+import pytest
+from PIL import Image as PILImage
+
+from models.image import Image
+
+from app.image_profiles import (
+    ENCODING_FLATE, ENCODING_JPEG, ImageProfile, IMAGE_PROFILES, DEFAULT_PROFILE,
+    get_image_profile, profile_name, thumbnail_pixels,
+)
+from app.pdf_images import export_images_to_pdf, make_thumbnail, THUMBNAIL_SIZE
+
+from benchmarks.generators import write_beam_map
+
+def test_profiles_resolve_by_name_or_default():
+    assert get_image_profile(None) is IMAGE_PROFILES[DEFAULT_PROFILE]
+    assert get_image_profile("") is IMAGE_PROFILES[DEFAULT_PROFILE]
+    assert get_image_profile("upload").encoding == ENCODING_JPEG
+    custom = ImageProfile(60, ENCODING_FLATE, None, None)
+    assert get_image_profile(custom) is custom
+    with pytest.raises(ValueError, match="Unknown image profile: huge"):
+        get_image_profile("huge")
+
+def test_profile_names():
+    assert profile_name(None) == DEFAULT_PROFILE
+    assert profile_name("archive") == "archive"
+    assert profile_name(IMAGE_PROFILES["preview"]) == "preview"
+    assert profile_name(ImageProfile(60, ENCODING_FLATE, None, None)) == "custom"
+
+def test_thumbnail_pixels_follow_the_dpi():
+    assert thumbnail_pixels(THUMBNAIL_SIZE, IMAGE_PROFILES["standard"]) == (250, 250)
+    assert thumbnail_pixels(THUMBNAIL_SIZE, IMAGE_PROFILES["archive"]) == (500, 500)
+    assert thumbnail_pixels(THUMBNAIL_SIZE, IMAGE_PROFILES["preview"]) == (167, 167)
+
+@pytest.mark.parametrize("name, fmt", [("standard", "BMP"), ("upload", "JPEG"), ("preview", "PNG")])
+def test_thumbnail_encoding(tmp_path, name, fmt):
+    path = str(tmp_path / "map.bmp")
+    write_beam_map(path, (320, 240))
+    with PILImage.open(make_thumbnail(path, profile=name)) as thumb:
+        assert thumb.format == fmt
+        assert thumb.size == thumbnail_pixels(THUMBNAIL_SIZE, IMAGE_PROFILES[name])
+
+@pytest.fixture
+def maps(tmp_path):
+    images = []
+    for i in range(3):
+        path = str(tmp_path / f"Map_{i:03d}.bmp")
+        write_beam_map(path, (320, 240), i)
+        images.append(Image(os.path.basename(path), path))
+    return images
+
+@pytest.mark.parametrize("name", sorted(IMAGE_PROFILES))
+def test_report_describes_the_profile_used(tmp_path, maps, name):
+    report = {}
+    pdf_path = export_images_to_pdf(maps, str(tmp_path), profile=name, report=report)
+    profile = IMAGE_PROFILES[name]
+
+    assert report["profile"] == name
+    assert report["encoding"] == profile.encoding
+    assert (report["dpi"], report["quality"], report["colors"]) == (profile.dpi, profile.quality, profile.colors)
+    assert report["pixels"] == list(thumbnail_pixels(THUMBNAIL_SIZE, profile))
+    assert report["images"] == 3
+    assert report["image_bytes"] > 0
+    assert report["pdf_bytes"] == os.path.getsize(pdf_path)
+
+    with open(pdf_path, "rb") as f:
+        data = f.read()
+    # JPEG thumbnails are embedded as they are; the others are Flate-compressed by ReportLab.
+    assert (b"/DCTDecode" in data) == (profile.encoding == ENCODING_JPEG)
+
+def test_custom_profile_is_reported_as_custom(tmp_path, maps):
+    report = {}
+    export_images_to_pdf(maps, str(tmp_path), profile=ImageProfile(36, ENCODING_FLATE, None, None), report=report)
+    assert report["profile"] == "custom"
+    assert report["pixels"] == [125, 125]
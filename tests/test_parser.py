@@ -0,0 +1,61 @@
+import os
+from collections import OrderedDict
+
+import pytest
+
+from app import parser
+from app.parser import iter_lines, parse_best_mode_file, SNIFF_BYTES
+
+from benchmarks.generators import write_best_mode_file
+
+NOTE = "Kommentar: Strahlprüfung für große Ströme"
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(parser, "_encoding_cache", OrderedDict())
+
+def _cp1252_log(tmp_path):
+    # An ASCII log longer than the sniffed prefix, with a cp1252 note after it.
+    path = write_best_mode_file(str(tmp_path / "BestModeData_V3.txt"), "NEXSA_MAGCIS_ISS", 3, 1, 0.0, 0)
+    assert os.path.getsize(path) > SNIFF_BYTES
+    with open(path, "ab") as f:
+        f.write((NOTE + "\n").encode("cp1252"))
+    return path
+
+def test_non_utf8_tail_falls_back_to_detected_encoding(tmp_path):
+    path = _cp1252_log(tmp_path)
+    lines = list(iter_lines(path))
+    assert lines[-1].rstrip("\n") == NOTE
+    # charset detection may name any single-byte code page that agrees on these letters.
+    cached = parser._encoding_cache[os.path.abspath(path)]
+    assert NOTE.encode("cp1252").decode(cached) == NOTE
+
+    system, _ = parse_best_mode_file(path)
+    assert len(system.results) > 0
+
+def test_appended_log_reuses_cached_encoding(tmp_path, monkeypatch):
+    path = _cp1252_log(tmp_path)
+    list(iter_lines(path))
+
+    with open(path, "ab") as f:
+        f.write("Größe\n".encode("cp1252"))
+
+    def no_detection(path):
+        raise AssertionError("charset detection ran for a cached log")
+
+    monkeypatch.setattr(parser, "detect_encoding", no_detection)
+    assert list(iter_lines(path))[-1].rstrip("\n") == "Größe"
+
+def test_cached_encoding_is_checked_against_the_prefix(tmp_path):
+    path = tmp_path / "log.txt"
+    path.write_bytes("Date Größe\n".encode("cp1252"))
+    parser._remember_encoding(str(path), "ascii")
+
+    assert parser._cached_encoding(str(path), path.read_bytes()) is None
+    assert os.path.abspath(path) not in parser._encoding_cache
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(parser, "ENCODING_CACHE_SIZE", 2)
+    for name in ("a.txt", "b.txt", "c.txt"):
+        parser._remember_encoding(name, "cp1252")
+    assert list(parser._encoding_cache) == [os.path.abspath("b.txt"), os.path.abspath("c.txt")]
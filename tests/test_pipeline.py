@@ -0,0 +1,69 @@
+import os
+import pstats
+import threading
+
+import pytest
+
+from app import pipeline
+from app.instrumentation import PROFILE_FILE
+from app.jobs import BackgroundJob, EVENT_CANCELLED, EVENT_DONE
+from app.pipeline import process_folder, shutdown_pool, STATUS_OK, STATUS_WRONG_MODES, SYSTEM_AUTO
+
+from benchmarks.generators import make_run_folder
+
+@pytest.fixture
+def folders(tmp_path):
+    yield [make_run_folder(str(tmp_path / f"run{i}"), "ESQ_EX06", images=3, image_size=(64, 48), seed=i)
+           for i in range(2)]
+    shutdown_pool()
+
+def test_parallel_runs_from_two_threads_take_turns(folders):
+    results = {}
+
+    def build(folder):
+        results[folder] = process_folder(folder, SYSTEM_AUTO, parallel=True)
+
+    threads = [threading.Thread(target=build, args=(folder,)) for folder in folders]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(60)
+
+    for folder in folders:
+        result = results[folder]
+        assert result["status"] in (STATUS_OK, STATUS_WRONG_MODES), result["errors"]
+        assert result["images_pdf"].startswith(folder)
+        assert result["table_pdf"].startswith(folder)
+    assert pipeline._run_counter >= 2
+
+def test_cancel_only_stops_its_own_run(folders):
+    holding, release = threading.Event(), threading.Event()
+
+    def blocked_build(folder, progress):
+        # Holds the run lock as a running build would, until the cancelled job has given up.
+        with pipeline._run_lock:
+            holding.set()
+            release.wait(30)
+        return process_folder(folder, SYSTEM_AUTO, parallel=True, progress=progress)
+
+    first = BackgroundJob(blocked_build, folders[0]).start()
+    second = BackgroundJob(process_folder, folders[1], SYSTEM_AUTO, parallel=True)
+    assert holding.wait(30)
+    second.start()
+    second.cancel()
+    second._thread.join(30)
+    release.set()
+    first._thread.join(60)
+
+    assert [kind for kind, _ in second.drain()] == [EVENT_CANCELLED]
+    events = first.drain()
+    assert events[-1][0] == EVENT_DONE
+    assert events[-1][1]["table_pdf"] is not None
+
+def test_profile_includes_the_worker_processes(folders, monkeypatch):
+    monkeypatch.setenv("IONIFY_PROFILE", "1")
+    process_folder(folders[0], SYSTEM_AUTO, parallel=True)
+
+    stats = pstats.Stats(os.path.join(folders[0], PROFILE_FILE))
+    functions = {name for _, _, name in stats.stats}
+    assert {"export_txt_to_pdf", "export_images_to_pdf", "_run_parallel_locked"} <= functions
@@ -0,0 +1,121 @@
+import os
+
+import pytest
+from openpyxl import Workbook
+
+from app import rule_store
+from app.rule_store import get_rules, get_defaults, invalidate, on_invalidate, CACHE_FILE
+from app.rules import RULES, expand_groups
+
+SYSTEM = "ESQ_EX06"
+FILENAME = "EX06_ESQ.xlsx"
+
+def write_workbook(path, limits=(), extractor_default=0):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Table 1"
+    ws.append(["Default registry values for a test system."])
+    ws.append(["Mode", None, None, "Electron Energy", None, "Fil", "Extractor", "Condenser", "Drift", "Magnet"])
+    ws.append([None, None, None, "(eV)", "(mA)", "(eV)", "(eV)", "(eV)", "(eV)", "(A)"])
+    ws.append(["[00]", 200, "Low", 120, 10, 3, extractor_default, 0, 1700, 0])
+    ws.append(["[01]", 500, "Med", 120, 10, 3, 0, 0, 1500, 2.5])
+    if limits:
+        sheet = wb.create_sheet(rule_store.LIMITS_SHEET)
+        sheet.append(["Preset", "Parameter", "Min", "Max", "Modes"])
+        for row in limits:
+            sheet.append(list(row))
+    wb.save(path)
+
+@pytest.fixture
+def workbooks(tmp_path, monkeypatch):
+    folder = tmp_path / "ExcelFiles"
+    folder.mkdir()
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    monkeypatch.setattr(rule_store, "WORKBOOK_DIR", str(folder))
+    monkeypatch.setattr(rule_store, "WORKBOOKS", {SYSTEM: FILENAME})
+    monkeypatch.setattr(rule_store, "cache_dir", lambda: str(cache))
+    monkeypatch.setattr(rule_store, "_invalidate_hooks", list(rule_store._invalidate_hooks))
+    invalidate()
+    yield folder / FILENAME
+    monkeypatch.undo()
+    invalidate()
+
+def test_defaults_come_from_the_first_sheet(workbooks):
+    write_workbook(workbooks)
+    defaults = get_defaults(SYSTEM)
+    assert defaults["drift"] == {"[00]": 1700, "[01]": 1500}
+    assert defaults["magnet"]["[01]"] == 2.5
+
+def test_limits_sheet_overrides_builtin_rules(workbooks):
+    write_workbook(workbooks, limits=[
+        (None, "extractor", 10, 20, "[00] [01]"),
+        ("tight", "drift", 1600, "1800", "[00]"),
+    ])
+    rules = get_rules(SYSTEM)
+    assert rules["extractor"] == {"[00]": (10.0, 20.0), "[01]": (10.0, 20.0)}
+    # Parameters the sheet does not mention keep their built-in limits.
+    assert rules["drift"] == expand_groups(RULES[SYSTEM]["default"]["drift"])
+
+    # A preset that only exists in the workbook.
+    assert get_rules(SYSTEM, "tight")["drift"] == {"[00]": (1600.0, 1800.0)}
+
+def test_bad_limit_names_the_row(workbooks):
+    write_workbook(workbooks, limits=[
+        (None, "extractor", 10, 20, "[00]"),
+        (None, "magnet", "low", 2, "[01]"),
+    ])
+    with pytest.raises(ValueError, match=r"Limits row 3: bad range 'low'\.\.2 for magnet"):
+        get_rules(SYSTEM)
+
+def test_unreadable_workbook_raises(workbooks):
+    workbooks.write_bytes(b"not a zip file")
+    with pytest.raises(ValueError, match="not a readable workbook"):
+        get_rules(SYSTEM)
+
+def test_cache_is_reused_until_the_workbook_changes(workbooks, monkeypatch):
+    write_workbook(workbooks, limits=[(None, "extractor", 10, 20, "[00]")])
+    assert get_rules(SYSTEM)["extractor"]["[00]"] == (10.0, 20.0)
+    assert os.path.isfile(os.path.join(rule_store.cache_dir(), CACHE_FILE))
+
+    compiled = []
+    real_compile = rule_store.compile_workbook
+
+    def counting_compile(path):
+        compiled.append(path)
+        return real_compile(path)
+
+    monkeypatch.setattr(rule_store, "compile_workbook", counting_compile)
+
+    # Same mtime and size: the cached entry is used without opening the workbook.
+    invalidate()
+    assert get_rules(SYSTEM)["extractor"]["[00]"] == (10.0, 20.0)
+    assert compiled == []
+
+    # Touched but unchanged: the sha256 still matches, so it is not compiled again.
+    stat = os.stat(workbooks)
+    os.utime(workbooks, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    invalidate()
+    get_rules(SYSTEM)
+    assert compiled == []
+
+    # New contents are compiled once invalidate() drops the per-process cache.
+    write_workbook(workbooks, limits=[(None, "extractor", 30, 40, "[00]")])
+    assert get_rules(SYSTEM)["extractor"]["[00]"] == (10.0, 20.0)
+    invalidate()
+    assert get_rules(SYSTEM)["extractor"]["[00]"] == (30.0, 40.0)
+    assert len(compiled) == 1
+
+def test_invalidate_runs_hooks(workbooks):
+    write_workbook(workbooks)
+    calls = []
+    on_invalidate(lambda: calls.append(True))
+    get_defaults(SYSTEM)
+    invalidate()
+    assert calls == [True]
+    assert get_defaults.cache_info().currsize == 0
+
+def test_cache_write_leaves_no_temporary_files(workbooks):
+    write_workbook(workbooks)
+    get_defaults(SYSTEM)
+    assert sorted(os.listdir(rule_store.cache_dir())) == [CACHE_FILE]
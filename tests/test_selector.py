@@ -0,0 +1,62 @@
+import pytest
+
+from app.functions import point_in_polygon
+from app.selector import HitMap, DESIGN_SIZE, REGIONS, LEFT, RIGHT
+
+def click_region(x, y, width, height, scaling, design_size=DESIGN_SIZE, regions=REGIONS):
+    # The per-click test the mask replaces: design coordinates, then each polygon in turn.
+    design_w, design_h = design_size
+    cur_x, cur_y = x / scaling, y / scaling
+    offset_x = (width / scaling - design_w) / 2
+    offset_y = (height / scaling - design_h) / 2
+    if not (offset_x <= cur_x <= offset_x + design_w and offset_y <= cur_y <= offset_y + design_h):
+        return None
+    for name, poly in regions:
+        if point_in_polygon(cur_x - offset_x, cur_y - offset_y, poly):
+            return name
+    return None
+
+@pytest.mark.parametrize("width, height, scaling", [
+    (892, 501, 1.0),
+    (1000, 600, 1.0),
+    (1338, 752, 1.5),
+    (1115, 626, 1.25),
+    # Smaller than the design: the image is cropped on every side.
+    (700, 400, 1.0),
+])
+def test_mask_matches_the_polygon_test(width, height, scaling):
+    hit_map = HitMap(width, height, scaling)
+    # Every other row, every third column, and all the columns around the diagonal edge.
+    for y in range(0, height, 2):
+        for x in sorted(set(range(0, width, 3)) | set(range(width // 2 - 40, width // 2 + 40))):
+            assert hit_map.region_at(x, y) == click_region(x, y, width, height, scaling), (x, y)
+
+def test_regions_of_the_design():
+    hit_map = HitMap(*DESIGN_SIZE, 1.0)
+    assert hit_map.region_at(100, 250) == LEFT
+    assert hit_map.region_at(800, 250) == RIGHT
+    # Either side of the diagonal from (369, 501) to (468, 0).
+    assert hit_map.region_at(410, 250) == LEFT
+    assert hit_map.region_at(425, 250) == RIGHT
+
+def test_margins_and_outside_points_hit_nothing():
+    hit_map = HitMap(1092, 601, 1.0)
+    assert hit_map.region_at(50, 300) is None
+    assert hit_map.region_at(1050, 300) is None
+    assert hit_map.region_at(150, 300) == LEFT
+    assert hit_map.region_at(-1, 300) is None
+    assert hit_map.region_at(1092, 300) is None
+    assert hit_map.region_at(500, 601) is None
+
+def test_widget_not_yet_laid_out():
+    hit_map = HitMap(0, 0, 1.0)
+    assert hit_map.region_at(0, 0) is None
+    assert HitMap(-5, 1, 2.0).width == 0
+
+def test_first_region_wins_where_they_overlap():
+    regions = (
+        ("a", ((0, 0), (60, 0), (60, 50), (0, 50))),
+        ("b", ((40, 0), (100, 0), (100, 50), (40, 50))),
+    )
+    hit_map = HitMap(100, 50, 1.0, (100, 50), regions)
+    assert [hit_map.region_at(x, 25) for x in (10, 50, 59, 61, 90)] == ["a", "a", "a", "b", "b"]
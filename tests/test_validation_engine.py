@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from models.measurement_table import MeasurementTable, mode_index_of
+
+from app.parser import parse_best_mode_file
+from app.rule_store import get_rules
+from app.rules import RATIO_RANGE_NEXSA, RATIO_RANGE_ESCALAB, SHIFT_RANGE, RATIO_RANGE_SPEC
+from app.systemConfig import get_config_by_system
+from app.validation import validate_row, in_range
+from app.validation_engine import compile_rules, wrong_modes_of
+
+from benchmarks.generators import SYSTEMS, write_best_mode_file
+
+def legacy_wrong_modes(measurements, system_type):
+    # The per-row loop export_txt_to_pdf ran before the compiled engine.
+    rules = get_rules(system_type)
+    max_i = get_config_by_system(system_type)["rows"]
+    ratio_range = RATIO_RANGE_NEXSA if system_type.startswith("NEXSA") else RATIO_RANGE_ESCALAB
+    sorted_by_idx = {mode_index_of(m.index): m for m in sorted(measurements, key=lambda m: mode_index_of(m.index))}
+
+    wrong_modes = []
+    for i in range(max_i + 1):
+        m = sorted_by_idx.get(i)
+        if m is None:
+            continue
+        for param, rng in validate_row(m, rules):
+            wrong_modes.append([m.index, param, rng])
+        if m.specification == "OK" and not in_range(m.ratio, *RATIO_RANGE_SPEC):
+            wrong_modes.append([m.index, "ratio", RATIO_RANGE_SPEC])
+        elif not in_range(m.ratio, *ratio_range):
+            wrong_modes.append([m.index, "ratio", ratio_range])
+        if not in_range(m.X_shift, *SHIFT_RANGE):
+            wrong_modes.append([m.index, "Xshift", SHIFT_RANGE])
+        if not in_range(m.Y_shift, *SHIFT_RANGE):
+            wrong_modes.append([m.index, "Yshift", SHIFT_RANGE])
+        if m.specification and str(m.specification).strip().upper() != "OK":
+            wrong_modes.append([m.index, "specification", ''])
+    return wrong_modes
+
+def _normalise(wrong_modes):
+    return [[str(idx), param, tuple(rng) if rng else rng] for idx, param, rng in wrong_modes]
+
+def _compare(table, system_type):
+    compiled = wrong_modes_of(compile_rules(system_type).evaluate(table).violations)
+    assert _normalise(compiled) == _normalise(legacy_wrong_modes(list(table), system_type))
+
+@pytest.mark.parametrize("system_type", SYSTEMS)
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_legacy_on_generated_runs(tmp_path, system_type, seed):
+    path = write_best_mode_file(str(tmp_path / "BestModeData_V3.txt"), system_type, 1, 1, 0.3, seed)
+    system, _ = parse_best_mode_file(path)
+    _compare(system.results, system_type)
+
+@pytest.mark.parametrize("system_type", SYSTEMS)
+def test_matches_legacy_on_range_edges(tmp_path, system_type):
+    path = write_best_mode_file(str(tmp_path / "BestModeData_V3.txt"), system_type, 1, 1, 0.0, 0)
+    system, _ = parse_best_mode_file(path)
+    rules = get_rules(system_type)
+    rng = random.Random(system_type)
+
+    table = MeasurementTable()
+    for m in system.results:
+        values = {name: getattr(m, name) for name in ("extractor", "drift", "magnet", "ratio", "X_shift", "Y_shift")}
+        for param in ("extractor", "drift", "magnet"):
+            limits = rules.get(param, {}).get(m.index)
+            if limits:
+                lo, hi = limits
+                # Exactly on a bound, or just past it.
+                values[param] = rng.choice((lo, hi, lo - 1e-9, hi + 1e-9))
+        values["ratio"] = rng.choice(RATIO_RANGE_SPEC + RATIO_RANGE_NEXSA + RATIO_RANGE_ESCALAB + (0.0,))
+        values["X_shift"] = rng.choice(SHIFT_RANGE + (SHIFT_RANGE[1] + 1e-9,))
+        values["Y_shift"] = rng.choice(SHIFT_RANGE + (SHIFT_RANGE[0] - 1e-9,))
+        specification = rng.choice(("OK", "ok ", "", "NO"))
+        table.append_row(
+            m.index, m.date, m.setup,
+            [values.get(name, getattr(m, name)) for name in (
+                "ion_energy_eV", "ion_energy_uA", "electron_energy_eV", "electron_energy_mA", "fil",
+                "extractor", "condensor", "drift", "magnet", "focus", "X_shift", "Y_shift", "ratio",
+                "sample_current_work", "sample_current_max", "sample_current_aim")],
+            m.mode, specification,
+        )
+    _compare(table, system_type)
+
+def test_duplicate_and_out_of_range_modes_follow_legacy_order(tmp_path):
+    system_type = "NEXSA_MAGCIS"
+    path = write_best_mode_file(str(tmp_path / "BestModeData_V3.txt"), system_type, 2, 1, 0.5, 7)
+    system, _ = parse_best_mode_file(path)
+    # Two date blocks: every mode appears twice and the later row wins.
+    _compare(system.results, system_type)
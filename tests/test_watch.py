@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+from app import watch
+from app.watch import FolderWatcher, MANIFEST_FILE
+from app.systemConfig import BEST_MODE_FILE, IMAGES_PDF, TABLE_PDF
+
+class FakePipeline():
+    # Stands in for process_folder: writes the requested PDFs unless told to fail them.
+    def __init__(self):
+        self.calls = []
+        self.fail_table = False
+
+    def __call__(self, folder, system_var, images=True, table=True, image_profile=None):
+        self.calls.append((images, table))
+        result = {"status": "ok", "images_pdf": None, "table_pdf": None, "wrong_modes": [], "errors": []}
+        if images:
+            result["images_pdf"] = os.path.join(folder, IMAGES_PDF)
+            open(result["images_pdf"], "wb").close()
+        if table and not self.fail_table:
+            result["table_pdf"] = os.path.join(folder, TABLE_PDF)
+            open(result["table_pdf"], "wb").close()
+        elif table:
+            result["status"] = "error"
+        return result
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    fake = FakePipeline()
+    monkeypatch.setattr(watch, "process_folder", fake)
+    return fake
+
+@pytest.fixture
+def folder(tmp_path):
+    (tmp_path / BEST_MODE_FILE).write_text("Date 06/01/2025 08:00:00\n")
+    (tmp_path / "map_00.bmp").write_bytes(b"BM first")
+    return tmp_path
+
+def test_rebuild_waits_for_the_folder_to_settle(folder, pipeline):
+    watcher = FolderWatcher(str(folder), debounce=2.0)
+    assert watcher.poll(now=0.0) is None
+    assert watcher.poll(now=1.0) is None
+
+    # A new file restarts the wait.
+    (folder / "map_01.bmp").write_bytes(b"BM second")
+    assert watcher.poll(now=1.5) is None
+    assert watcher.poll(now=3.0) is None
+    assert pipeline.calls == []
+
+    result = watcher.poll(now=3.5)
+    assert pipeline.calls == [(True, True)]
+    assert result["rebuilt"] == [IMAGES_PDF, TABLE_PDF]
+    assert watcher.poll(now=10.0) is None
+    assert len(pipeline.calls) == 1
+
+def test_manifest_skips_unchanged_inputs(folder, pipeline):
+    watcher = FolderWatcher(str(folder), debounce=0.0)
+    watcher.poll(now=0.0)
+    watcher.poll(now=0.0)
+    assert pipeline.calls == [(True, True)]
+
+    # A fresh watcher, e.g. after a restart, trusts the manifest.
+    watcher = FolderWatcher(str(folder), debounce=0.0)
+    watcher.poll(now=0.0)
+    assert watcher.poll(now=0.0) is None
+
+    # A touched file is hashed again, but equal contents do not rebuild.
+    stat = os.stat(folder / "map_00.bmp")
+    os.utime(folder / "map_00.bmp", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    watcher.poll(now=1.0)
+    assert watcher.poll(now=1.0) is None
+    assert len(pipeline.calls) == 1
+
+    # Only the report whose inputs changed is rebuilt.
+    (folder / "map_00.bmp").write_bytes(b"BM changed")
+    watcher.poll(now=2.0)
+    assert watcher.poll(now=2.0)["rebuilt"] == [IMAGES_PDF]
+    assert pipeline.calls[-1] == (True, False)
+
+def test_mark_current_records_existing_reports(folder, pipeline):
+    (folder / IMAGES_PDF).write_bytes(b"%PDF")
+    (folder / TABLE_PDF).write_bytes(b"%PDF")
+    watcher = FolderWatcher(str(folder), debounce=0.0)
+    watcher.mark_current()
+    assert watcher.poll(now=0.0) is None
+    assert pipeline.calls == []
+
+def test_failed_part_is_retried_with_backoff(folder, pipeline):
+    pipeline.fail_table = True
+    watcher = FolderWatcher(str(folder), debounce=1.0)
+    watcher.poll(now=0.0)
+    watcher.poll(now=1.0)
+    assert pipeline.calls == [(True, True)]
+
+    # The images were written and recorded; the table stays stale.
+    with open(folder / MANIFEST_FILE, encoding="utf-8") as f:
+        outputs = json.load(f)["outputs"]
+    assert "images" in outputs and "table" not in outputs
+
+    # One failure doubles the wait before the retry.
+    assert watcher.poll(now=2.5) is None
+    pipeline.fail_table = False
+    result = watcher.poll(now=3.0)
+    assert pipeline.calls[-1] == (False, True)
+    assert result["rebuilt"] == [TABLE_PDF]
+
+    assert watcher.poll(now=100.0) is None
+    assert len(pipeline.calls) == 2
+
+def test_backoff_is_capped(folder, pipeline):
+    watcher = FolderWatcher(str(folder), debounce=2.0)
+    watcher._failures = 20
+    assert watcher._delay() == watch.RETRY_MAX
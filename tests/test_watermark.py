@@ -0,0 +1,34 @@
+import io
+import os
+
+from PIL import Image as PILImage
+
+from app.parser import parse_best_mode_file
+from app.pdf_table import export_txt_to_pdf
+from app.systemConfig import TABLE_PDF
+from app.watermark import get_watermark, _load_watermark, WATERMARK_MAX_PX
+
+from benchmarks.generators import write_best_mode_file
+
+def test_watermark_is_downscaled_once_per_system():
+    watermark = get_watermark("NEXSA_EX06")
+    assert watermark is get_watermark("NEXSA_EX06")
+    assert watermark.max_px == WATERMARK_MAX_PX
+
+    data, size = _load_watermark(watermark.image_path, watermark.max_px)
+    assert max(size) == WATERMARK_MAX_PX
+    assert _load_watermark(watermark.image_path, watermark.max_px)[0] is data
+    with PILImage.open(io.BytesIO(data)) as img:
+        assert img.format == "JPEG" and img.size == size
+    assert len(data) < os.path.getsize(watermark.image_path)
+
+def test_reports_embed_the_downscaled_watermark(tmp_path):
+    txt = write_best_mode_file(str(tmp_path / "BestModeData_V3.txt"), "NEXSA_EX06", 1, 1, 0.0, 0)
+    parsed, flags = parse_best_mode_file(txt)
+    for _ in range(2):
+        export_txt_to_pdf(parsed, str(tmp_path), True, flags["ion_gun"], flags["iss"], flags["oe"])
+        with open(tmp_path / TABLE_PDF, "rb") as f:
+            pdf = f.read()
+        # One image XObject, shared by every page through the watermark form.
+        assert pdf.count(b"/Subtype /Image") == 1
+        assert f"/Width {WATERMARK_MAX_PX}".encode() in pdf